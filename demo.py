@@ -27,8 +27,8 @@ def main():
         cli.print_colored(f"🎯 Demo {i}/{len(demo_ips)}: Analyzing {ip}", "yellow")
         print()
 
-        data = cli.get_ip_info(ip)
-        cli.display_results(ip, data)
+        result = cli.lookup(ip)
+        cli.display_results(ip, result.raw, result.compiled)
 
         if i < len(demo_ips):
             print()
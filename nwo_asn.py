@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Offline ASN Resolution
+Longest-prefix-match table built from a local prefix-to-AS dump
+"""
+
+import gzip
+import ipaddress
+import sys
+from array import array
+from bisect import bisect_right
+
+
+class ASNMatch(tuple):
+    """Result of a table lookup: (as_number, as_name, prefix)"""
+
+    __slots__ = ()
+
+    def __new__(cls, as_number, as_name, prefix):
+        return tuple.__new__(cls, (as_number, as_name, prefix))
+
+    as_number = property(lambda self: self[0])
+    as_name = property(lambda self: self[1])
+    prefix = property(lambda self: self[2])
+
+
+def _normalize_asn(asn):
+    """Return an ASN in ip-api's 'AS15169' form"""
+    asn = asn.strip()
+    if asn.upper().startswith('AS'):
+        asn = asn[2:]
+    return sys.intern(f"AS{int(asn)}")
+
+
+class _FamilyTable:
+    """Flattened, non-overlapping intervals for one address family
+
+    Nested prefixes are flattened at build time so that every interval maps
+    to its most specific covering prefix; a lookup is then a single binary
+    search over the interval starts.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.entries = []
+        self.starts = None
+        self.ends = None
+        self.records = None
+
+    def add(self, first, last, record):
+        self.entries.append((first, last, record))
+
+    def build(self):
+        # Containing prefixes sort before the prefixes nested inside them
+        self.entries.sort(key=lambda entry: (entry[0], -entry[1]))
+
+        starts, ends, records = [], [], []
+
+        def emit(first, last, record):
+            if first > last:
+                return
+            if records and records[-1] is record and ends[-1] + 1 == first:
+                ends[-1] = last
+                return
+            starts.append(first)
+            ends.append(last)
+            records.append(record)
+
+        stack = []
+        cursor = 0
+        for first, last, record in self.entries:
+            while stack and stack[-1][0] < first:
+                top_last, top_record = stack.pop()
+                emit(cursor, top_last, top_record)
+                cursor = max(cursor, top_last + 1)
+            if stack:
+                emit(cursor, first - 1, stack[-1][1])
+            stack.append((last, record))
+            cursor = max(cursor, first)
+        while stack:
+            top_last, top_record = stack.pop()
+            emit(cursor, top_last, top_record)
+            cursor = max(cursor, top_last + 1)
+
+        if self.version == 4:
+            self.starts = array('L', starts)
+            self.ends = array('L', ends)
+        else:
+            self.starts, self.ends = starts, ends
+        self.records = records
+
+    def find(self, value):
+        index = bisect_right(self.starts, value) - 1
+        if index >= 0 and value <= self.ends[index]:
+            return index
+        return None
+
+    def __len__(self):
+        return len(self.records) if self.records is not None else 0
+
+
+class ASNTable:
+    """Longest-prefix-match table mapping IPv4/IPv6 addresses to their origin AS"""
+
+    def __init__(self):
+        self._tables = {4: _FamilyTable(4), 6: _FamilyTable(6)}
+        self._built = False
+
+    @classmethod
+    def load(cls, path):
+        """Load a prefix-to-AS dump (plain or .gz) and build the table
+
+        Accepted line formats (blank lines and '#'/';' comments are skipped):
+          ``<prefix> <asn> [as name]``         e.g. pyasn / BGP RIB dumps
+          ``<first>\\t<last>\\t<asn>\\t<cc>\\t<as name>``  e.g. iptoasn.com TSV
+        """
+        table = cls()
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                table.add_line(line)
+        table.build()
+        return table
+
+    def add_line(self, line):
+        """Parse one dump line; returns False when it was skipped"""
+        line = line.strip()
+        if not line or line[0] in '#;':
+            return False
+
+        try:
+            if '/' in line.split(None, 1)[0]:
+                parts = line.split(None, 2)
+                name = parts[2] if len(parts) > 2 else None
+                self.add_prefix(parts[0], parts[1], name)
+            else:
+                parts = line.split('\t') if '\t' in line else line.split(None, 4)
+                if parts[2].strip() in ('0', 'AS0'):
+                    return False  # iptoasn marks unrouted space with AS0
+                name = parts[4].strip() if len(parts) > 4 else None
+                self.add_range(parts[0].strip(), parts[1].strip(), parts[2], name)
+        except (ValueError, IndexError):
+            return False
+        return True
+
+    def add_prefix(self, prefix, asn, name=None):
+        """Add one announced prefix"""
+        network = ipaddress.ip_network(prefix, strict=False)
+        record = ASNMatch(_normalize_asn(asn), sys.intern(name) if name else None,
+                          str(network))
+        self._add(network.version, int(network.network_address),
+                  int(network.broadcast_address), record)
+
+    def add_range(self, first, last, asn, name=None):
+        """Add an inclusive address range, e.g. from iptoasn.com"""
+        first, last = ipaddress.ip_address(first), ipaddress.ip_address(last)
+        if first.version != last.version:
+            raise ValueError("Range endpoints must share an address family")
+        record = ASNMatch(_normalize_asn(asn), sys.intern(name) if name else None,
+                          f"{first}-{last}")
+        self._add(first.version, int(first), int(last), record)
+
+    def _add(self, version, first, last, record):
+        self._tables[version].add(first, last, record)
+        self._built = False
+
+    def build(self):
+        """Flatten all added prefixes into lookup intervals"""
+        for table in self._tables.values():
+            table.build()
+        self._built = True
+
+    def _resolve(self, ip):
+        if not self._built:
+            self.build()
+        if isinstance(ip, str):
+            ip = ipaddress.ip_address(ip)
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        return self._tables[ip.version], int(ip)
+
+    def lookup(self, ip):
+        """Return the ASNMatch for the most specific prefix covering ip, or None"""
+        table, value = self._resolve(ip)
+        index = table.find(value)
+        return None if index is None else table.records[index]
+
+    def lookup_interval(self, ip):
+        """Return (first, last, ASNMatch) for the interval attributed to ip, or None
+
+        The interval is the part of the matched prefix not covered by any
+        more specific prefix, as integer addresses.
+        """
+        table, value = self._resolve(ip)
+        index = table.find(value)
+        if index is None:
+            return None
+        return table.starts[index], table.ends[index], table.records[index]
+
+    def next_start(self, ip):
+        """Return the first integer address above ip covered by the table, or None"""
+        table, value = self._resolve(ip)
+        index = bisect_right(table.starts, value)
+        return table.starts[index] if index < len(table.starts) else None
+
+    def __len__(self):
+        return sum(len(table) for table in self._tables.values())
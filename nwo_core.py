@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Lookup Engine
+Asyncio lookup core shared by the CLI, the GUI and embedding services
+"""
+
+import asyncio
+import ipaddress
+import json
+import time
+
+import requests
+
+from nwo_ranges import fallback_block
+from nwo_results import IPResult
+from nwo_trace import tracer, probe_dns_async
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+# ip-api.com response keys feeding each compiled field
+IP_API_FIELDS = {
+    'country': 'country',
+    'country_code': 'countryCode',
+    'region': 'regionName',
+    'city': 'city',
+    'latitude': 'lat',
+    'longitude': 'lon',
+    'timezone': 'timezone',
+    'postal_code': 'zip',
+    'continent': 'continent',
+    'continent_code': 'continentCode',
+    'isp': 'isp',
+    'organization': 'org',
+    'as_number': 'as',
+    'as_name': 'asname',
+    'is_proxy': 'proxy',
+    'is_hosting': 'hosting',
+    'is_mobile': 'mobile',
+    'currency': 'currency'
+}
+
+# ipinfo.io response keys used to fill gaps left by ip-api.com
+IPINFO_FIELDS = {
+    'country': 'country',
+    'region': 'region',
+    'city': 'city',
+    'postal_code': 'postal',
+    'organization': 'org'
+}
+
+# RIPEstat returns the announced prefix and origin AS covering an address
+PREFIX_API_URL = 'https://stat.ripe.net/data/network-info/data.json?resource={ip}'
+
+
+class ProviderResponse:
+    """Raw HTTP response from a provider; header names are lower-cased"""
+
+    __slots__ = ('status', 'body', 'headers', 'elapsed')
+
+    def __init__(self, status, body, headers, elapsed):
+        self.status = status
+        self.body = body
+        self.headers = headers
+        self.elapsed = elapsed
+
+    def json(self):
+        with tracer.span('json.decode'):
+            return json.loads(self.body)
+
+
+class LookupResult:
+    """Structured outcome of one lookup
+
+    ``compiled`` holds the merged fields, ``raw`` the decoded response of
+    every provider that answered and ``errors`` a message per provider that
+    did not.
+    """
+
+    __slots__ = ('ip', 'compiled', 'raw', 'errors', 'elapsed')
+
+    def __init__(self, ip, compiled, raw, errors, elapsed):
+        self.ip = ip
+        self.compiled = compiled
+        self.raw = raw
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return bool(self.compiled)
+
+    def to_result(self):
+        """Return a compact IPResult, dropping the raw responses"""
+        return IPResult.from_compiled(self.ip, self.compiled)
+
+    def as_dict(self):
+        return {
+            'ip': self.ip,
+            'compiled': self.compiled,
+            'raw': self.raw,
+            'errors': self.errors,
+            'elapsed': self.elapsed
+        }
+
+    def __repr__(self):
+        return f"LookupResult({self.ip!r}, fields={len(self.compiled)}, errors={list(self.errors)})"
+
+
+def _http_trace_config():
+    """aiohttp hooks recording DNS, connect and time-to-headers spans in sampled traces"""
+    config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.ready = time.perf_counter_ns()
+
+    async def on_dns_resolvehost_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter_ns()
+
+    async def on_dns_resolvehost_end(session, ctx, params):
+        now = time.perf_counter_ns()
+        tracer.add_span('dns.resolve', ctx.dns_start, now - ctx.dns_start, host=params.host)
+        ctx.ready = now
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter_ns()
+
+    async def on_connection_create_end(session, ctx, params):
+        # Connection setup includes name resolution, which has its own span
+        now = time.perf_counter_ns()
+        start = max(ctx.connect_start, ctx.ready)
+        tracer.add_span('http.connect', start, now - start)
+        ctx.ready = now
+
+    async def on_request_end(session, ctx, params):
+        # Fired once the response headers are in: server time on a ready connection
+        now = time.perf_counter_ns()
+        tracer.add_span('http.headers', ctx.ready, now - ctx.ready, status=params.response.status)
+
+    config.on_request_start.append(on_request_start)
+    config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_request_end.append(on_request_end)
+    return config
+
+
+class _Transport:
+    """HTTP session and in-flight request limit for one event loop"""
+
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = None
+        if AIOHTTP_AVAILABLE:
+            # Trace hooks are only installed while tracing is enabled
+            trace_configs = [_http_trace_config()] if tracer.enabled else None
+            self.session = aiohttp.ClientSession(trace_configs=trace_configs)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+def _ignore_event(event, provider, detail=None):
+    pass
+
+
+class LookupEngine:
+    """Non-blocking IP lookup engine
+
+    HTTP goes through aiohttp when it is installed; otherwise requests runs
+    in worker threads so the event loop is never blocked. ``concurrency``
+    bounds the provider requests in flight and ``lookup_many`` only pulls
+    new IPs from its input as earlier lookups complete.
+
+    Use ``async with LookupEngine() as engine`` to share one connection pool
+    across calls; lookups made outside such a block open a short-lived one.
+    Nested or concurrent ``async with`` blocks on the same event loop share
+    one pool, closed when the last block exits. Blocking front ends use
+    ``run_sync`` / ``lookup_sync``.
+    """
+
+    def __init__(self, asn_table=None, fields=None, concurrency=16, timeout=10):
+        # Optional offline ASN table; fills AS fields without a provider round trip
+        self.asn_table = asn_table
+        # Optional field projection; None means every field
+        self.fields = frozenset(fields) if fields else None
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # Upstream HTTP requests issued, for reporting
+        self.request_count = 0
+        # Event loop -> [transport, open async-with blocks]; sessions and
+        # semaphores are bound to the loop that created them
+        self._transports = {}
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        entry = self._transports.get(loop)
+        if entry is None:
+            entry = self._transports[loop] = [_Transport(self.concurrency), 0]
+        entry[1] += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        loop = asyncio.get_running_loop()
+        entry = self._transports[loop]
+        entry[1] -= 1
+        if entry[1] == 0:
+            del self._transports[loop]
+            await entry[0].close()
+        return False
+
+    def _shared_transport(self):
+        """Return the transport of an enclosing async-with block on this loop, or None"""
+        entry = self._transports.get(asyncio.get_running_loop())
+        return entry[0] if entry else None
+
+    async def _with_transport(self, func, *args, **kwargs):
+        transport = self._shared_transport()
+        if transport is not None:
+            return await func(transport, *args, **kwargs)
+        transport = _Transport(self.concurrency)
+        try:
+            return await func(transport, *args, **kwargs)
+        finally:
+            await transport.close()
+
+    def run_sync(self, coro):
+        """Run a coroutine to completion from blocking code (CLI/GUI threads)"""
+        return asyncio.run(coro)
+
+    # Providers
+
+    def provider_apis(self, ip):
+        """Return the API sources queried for an IP
+
+        With a field projection, ip-api.com is asked only for the keys backing
+        the requested fields, and providers that cannot contribute any of them
+        (including fields the offline ASN table already answers) are skipped.
+        """
+        if self.fields is None:
+            return [
+                {
+                    'name': 'IP-API',
+                    'url': f'http://ip-api.com/json/{ip}?fields=status,message,continent,continentCode,country,countryCode,region,regionName,city,district,zip,lat,lon,timezone,offset,currency,isp,org,as,asname,mobile,proxy,hosting,query',
+                    'free': True
+                },
+                {
+                    'name': 'IPInfo',
+                    'url': f'https://ipinfo.io/{ip}/json',
+                    'free': True
+                }
+            ]
+
+        wanted = set(self.fields)
+        if self.asn_table is not None:
+            match = self.asn_table.lookup(ip)
+            if match:
+                wanted.difference_update(('as_number', 'as_prefix'))
+                if match.as_name:
+                    wanted.discard('as_name')
+
+        apis = []
+        ip_api_keys = sorted({IP_API_FIELDS[field] for field in wanted if field in IP_API_FIELDS})
+        if ip_api_keys:
+            apis.append({
+                'name': 'IP-API',
+                'url': f"http://ip-api.com/json/{ip}?fields=status,message,{','.join(ip_api_keys)}",
+                'free': True
+            })
+        gap_fields = sorted(wanted.intersection(IPINFO_FIELDS))
+        if gap_fields:
+            apis.append({
+                'name': 'IPInfo',
+                'url': f'https://ipinfo.io/{ip}/json',
+                'free': True,
+                # Only queried when ip-api.com left one of these empty
+                'fills': gap_fields
+            })
+        return apis
+
+    def gaps_answered(self, data, fields):
+        """Check whether ip-api.com already returned every gap-fill field"""
+        d = data.get('IP-API')
+        if not d or d.get('status') != 'success':
+            return False
+        return all(d.get(IP_API_FIELDS[field]) for field in fields)
+
+    # HTTP
+
+    async def _get(self, transport, url, headers=None):
+        async with transport.semaphore:
+            self.request_count += 1
+            if transport.session is None:
+                # requests does not report DNS time; sampled lookups probe it first
+                await probe_dns_async(url)
+            start = time.perf_counter_ns()
+            with tracer.span('http.request', url=url):
+                if transport.session is not None:
+                    # DNS, connect and time-to-headers spans come from the session's trace hooks
+                    timeout = aiohttp.ClientTimeout(total=self.timeout)
+                    async with transport.session.get(url, headers=headers, timeout=timeout) as response:
+                        with tracer.span('http.body'):
+                            body = await response.read()
+                        status, response_headers = response.status, response.headers
+                else:
+                    response = await asyncio.to_thread(
+                        requests.get, url, headers=headers, timeout=self.timeout)
+                    tracer.add_span('http.headers', start, int(response.elapsed.total_seconds() * 1e9),
+                                    status=response.status_code)
+                    body = response.content
+                    status, response_headers = response.status_code, response.headers
+            elapsed = (time.perf_counter_ns() - start) / 1e9
+        # Lower-cased so header lookups behave the same for both HTTP clients
+        headers = {key.lower(): value for key, value in response_headers.items()}
+        return ProviderResponse(status, body, headers, elapsed)
+
+    async def fetch(self, url, headers=None):
+        """Perform one GET request and return a ProviderResponse"""
+        return await self._with_transport(self._get, url, headers)
+
+    # Lookups
+
+    async def _lookup(self, transport, ip, on_event=_ignore_event):
+        start = time.perf_counter()
+        raw, errors = {}, {}
+
+        with tracer.span('engine.lookup', ip=ip):
+            for api in self.provider_apis(ip):
+                name = api['name']
+                if 'fills' in api and self.gaps_answered(raw, api['fills']):
+                    on_event('skipped', name)
+                    continue
+                on_event('query', name)
+                try:
+                    with tracer.span('provider', api=name):
+                        response = await self._get(transport, api['url'])
+                        if response.status == 200:
+                            raw[name] = response.json()
+                            on_event('success', name)
+                        else:
+                            errors[name] = f"HTTP {response.status}"
+                            on_event('status', name, response.status)
+                except Exception as e:
+                    errors[name] = str(e)
+                    on_event('exception', name, e)
+
+            with tracer.span('compile'):
+                compiled = self.compile(raw, ip)
+
+        return LookupResult(ip, compiled, raw, errors, time.perf_counter() - start)
+
+    async def lookup(self, ip, on_event=_ignore_event):
+        """Look up one IP and return a LookupResult
+
+        ``on_event(event, provider, detail=None)`` is called as providers are
+        queried; events are 'query', 'success', 'status' (non-200, detail is
+        the status code), 'exception' (detail is the exception) and 'skipped'.
+        """
+        return await self._with_transport(self._lookup, ip, on_event)
+
+    async def _lookup_handled(self, transport, ip, on_result):
+        # One top-level span so the lookup and its handling share a trace
+        with tracer.span('lookup', ip=ip):
+            result = await self._lookup(transport, ip)
+            on_result(result)
+        return result
+
+    async def _lookup_many(self, transport, ips, concurrency, on_result=None):
+        # Wait on the next input item and the running lookups together, so a
+        # slow or idle input (e.g. an interactive prompt) never holds back
+        # results that are already finished
+        source = _aiter(ips)
+        next_ip = None
+        pending = set()
+        try:
+            while True:
+                if next_ip is None and source is not None and len(pending) < concurrency:
+                    next_ip = asyncio.ensure_future(source.__anext__())
+                waiting = pending if next_ip is None else pending | {next_ip}
+                if not waiting:
+                    break
+
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if next_ip in done:
+                    done.discard(next_ip)
+                    try:
+                        ip = next_ip.result()
+                    except StopAsyncIteration:
+                        source = None
+                    else:
+                        if on_result is None:
+                            lookup = self._lookup(transport, str(ip))
+                        else:
+                            lookup = self._lookup_handled(transport, str(ip), on_result)
+                        pending.add(asyncio.create_task(lookup))
+                    next_ip = None
+                for task in done:
+                    pending.discard(task)
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if next_ip is not None:
+                next_ip.cancel()
+
+    async def lookup_many(self, ips, concurrency=None, on_result=None):
+        """Look up IPs from a (sync or async) iterable, yielding results as they complete
+
+        At most ``concurrency`` lookups are in flight; the input is consumed
+        only as slots free up, so unbounded or streaming inputs are safe.
+        Finished lookups are yielded right away, also while the input is
+        still waiting for its next item. ``on_result(result)`` is called in
+        the lookup's own task, within the same top-level trace span as the
+        lookup, e.g. to render it.
+        """
+        concurrency = concurrency or self.concurrency
+        transport = self._shared_transport()
+        if transport is not None:
+            async for result in self._lookup_many(transport, ips, concurrency, on_result):
+                yield result
+            return
+
+        transport = _Transport(self.concurrency)
+        try:
+            async for result in self._lookup_many(transport, ips, concurrency, on_result):
+                yield result
+        finally:
+            await transport.close()
+
+    def lookup_sync(self, ip, on_event=_ignore_event):
+        """Blocking wrapper around lookup()"""
+        return self.run_sync(self.lookup(ip, on_event))
+
+    # Compilation
+
+    def compile(self, data, ip=None):
+        """Compile data from multiple API sources"""
+        compiled = {}
+        fields = self.fields
+
+        # Process ip-api.com data
+        if 'IP-API' in data and data['IP-API'].get('status') == 'success':
+            d = data['IP-API']
+            for field, key in IP_API_FIELDS.items():
+                if fields is None or field in fields:
+                    compiled[field] = d.get(key, False) if field.startswith('is_') else d.get(key)
+            if 'as_number' in compiled:
+                compiled['as_number'] = d.get('as', '').split(' ')[0] if d.get('as') else None
+
+        # Process ipinfo.io data (fill gaps)
+        if 'IPInfo' in data:
+            d = data['IPInfo']
+            for field, key in IPINFO_FIELDS.items():
+                if (fields is None or field in fields) and not compiled.get(field):
+                    compiled[field] = d.get(key)
+
+        # Offline ASN table takes precedence; providers only fill table misses
+        if ip and self.asn_table is not None:
+            match = self.asn_table.lookup(ip)
+            if match:
+                compiled['as_number'] = match.as_number
+                if match.as_name:
+                    compiled['as_name'] = match.as_name
+                compiled['as_prefix'] = match.prefix
+            if fields is not None:
+                compiled = {field: value for field, value in compiled.items() if field in fields}
+
+        return compiled
+
+    # Prefix discovery
+
+    async def _discover_prefix(self, transport, address, on_event=_ignore_event):
+        if self.asn_table is not None:
+            interval = self.asn_table.lookup_interval(address)
+            if interval:
+                first, last, match = interval
+                return first, last, match.prefix, match.as_number
+            next_start = self.asn_table.next_start(address)
+            if next_start is None:
+                next_start = 2 ** address.max_prefixlen
+            return int(address), next_start - 1, None, None
+
+        try:
+            with tracer.span('prefix.discover', ip=str(address)):
+                response = await self._get(transport, PREFIX_API_URL.format(ip=address))
+            if response.status == 200:
+                info = response.json().get('data', {})
+                network = ipaddress.ip_network(info['prefix'], strict=False) if info.get('prefix') else None
+                # A prefix not covering the address would stall the range walk
+                if network is not None and address in network:
+                    asns = info.get('asns') or []
+                    asn = f"AS{asns[0]}" if asns else None
+                    return int(network.network_address), int(network.broadcast_address), str(network), asn
+        except Exception as e:
+            on_event('exception', 'RIPEstat', e)
+
+        first, last = fallback_block(address)
+        return first, last, None, None
+
+    async def discover_prefix(self, address, on_event=_ignore_event):
+        """Find the announced prefix covering an address
+
+        Returns (first, last, prefix, asn) with integer bounds; prefix and asn
+        are None for unannounced space. The offline ASN table is used when
+        loaded; its bounds stop at the next more specific prefix. Otherwise
+        one RIPEstat query is made, which returns the whole most specific
+        prefix covering the address even if more specific ones lie inside it.
+        """
+        return await self._with_transport(self._discover_prefix, address, on_event)
+
+
+async def _aiter(iterable):
+    """Iterate a sync or async iterable asynchronously"""
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+
+async def lookup(ip, **options):
+    """Look up one IP with a default engine; options are passed to LookupEngine"""
+    return await LookupEngine(**options).lookup(ip)
+
+
+async def lookup_many(ips, **options):
+    """Look up many IPs with a default engine, yielding results as they complete"""
+    async for result in LookupEngine(**options).lookup_many(ips):
+        yield result
@@ -6,7 +6,6 @@ A modern IP lookup tool with terminal-style GUI
 
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
-import requests
 import json
 import threading
 import ipaddress
@@ -15,6 +14,9 @@ from datetime import datetime
 import sys
 import os
 
+from nwo_core import LookupEngine
+from nwo_trace import tracer, configure_from_env
+
 class NWOLookupTool:
     def __init__(self):
         self.root = tk.Tk()
@@ -22,6 +24,9 @@ class NWOLookupTool:
         self.root.geometry("1000x700")
         self.root.configure(bg='#1e1e1e')
 
+        # Shared lookup engine; the GUI only renders its results
+        self.engine = LookupEngine()
+
         # Configure style for modern look
         self.setup_styles()
 
@@ -202,48 +207,20 @@ class NWOLookupTool:
 
     def _perform_lookup(self, ip):
         """Perform the actual IP lookup"""
+        with tracer.span('lookup', ip=ip):
+            self._run_lookup(ip)
+
+    def _run_lookup(self, ip):
+        """Query the APIs and display the results"""
         try:
             self.print_to_terminal(f"🎯 Starting lookup for IP: {ip}", "cyan")
             self.print_to_terminal("═" * 80, "gray")
 
-            # Multiple API sources for comprehensive data
-            apis = [
-                {
-                    'name': 'IPStack',
-                    'url': f'http://ip-api.com/json/{ip}?fields=status,message,continent,continentCode,country,countryCode,region,regionName,city,district,zip,lat,lon,timezone,offset,currency,isp,org,as,asname,mobile,proxy,hosting,query',
-                    'free': True
-                },
-                {
-                    'name': 'IPInfo',
-                    'url': f'https://ipinfo.io/{ip}/json',
-                    'free': True
-                },
-                {
-                    'name': 'IPGeolocation',
-                    'url': f'https://api.ipgeolocation.io/ipgeo?apiKey=&ip={ip}',
-                    'free': True
-                }
-            ]
-
-            all_data = {}
-
-            for api in apis:
-                try:
-                    self.print_to_terminal(f"📡 Querying {api['name']} API...", "yellow")
-                    response = requests.get(api['url'], timeout=10)
-
-                    if response.status_code == 200:
-                        data = response.json()
-                        all_data[api['name']] = data
-                        self.print_to_terminal(f"✅ {api['name']} - Success", "green")
-                    else:
-                        self.print_to_terminal(f"❌ {api['name']} - Error: {response.status_code}", "red")
-
-                except Exception as e:
-                    self.print_to_terminal(f"❌ {api['name']} - Exception: {str(e)}", "red")
+            result = self.engine.lookup_sync(ip, on_event=self._provider_event)
 
             # Process and display results
-            self._display_results(ip, all_data)
+            with tracer.span('render', ip=ip):
+                self._display_results(ip, result.raw, result.compiled)
 
         except Exception as e:
             self.print_to_terminal(f"❌ Lookup failed: {str(e)}", "red")
@@ -251,13 +228,24 @@ class NWOLookupTool:
             # Re-enable UI
             self.root.after(0, self._finish_lookup)
 
+    def _provider_event(self, event, provider, detail=None):
+        """Report engine provider progress in the terminal output"""
+        if event == 'query':
+            self.print_to_terminal(f"📡 Querying {provider} API...", "yellow")
+        elif event == 'success':
+            self.print_to_terminal(f"✅ {provider} - Success", "green")
+        elif event == 'status':
+            self.print_to_terminal(f"❌ {provider} - Error: {detail}", "red")
+        elif event == 'exception':
+            self.print_to_terminal(f"❌ {provider} - Exception: {str(detail)}", "red")
+
     def _finish_lookup(self):
         """Finish lookup and re-enable UI"""
         self.progress.stop()
         self.lookup_btn.config(state='normal')
         self.status_label.config(text="Ready")
 
-    def _display_results(self, ip, data):
+    def _display_results(self, ip, data, compiled_data):
         """Display comprehensive IP lookup results"""
         self.print_to_terminal("═" * 80, "gray")
         self.print_to_terminal("🎯 COMPREHENSIVE IP ANALYSIS REPORT", "cyan")
@@ -267,9 +255,6 @@ class NWOLookupTool:
         self.print_to_terminal("📍 BASIC INFORMATION", "yellow")
         self.print_to_terminal(f"Target IP: {ip}", "white")
 
-        # Compile data from all sources
-        compiled_data = self._compile_data(data)
-
         if compiled_data:
             # Geographic Information
             self.print_to_terminal("\n🌍 GEOGRAPHIC LOCATION", "yellow")
@@ -315,53 +300,13 @@ class NWOLookupTool:
         self.print_to_terminal("✅ ANALYSIS COMPLETE", "green")
         self.print_to_terminal("═" * 80, "gray")
 
-    def _compile_data(self, data):
-        """Compile data from multiple API sources"""
-        compiled = {}
-
-        # Process ip-api.com data
-        if 'IPStack' in data and data['IPStack'].get('status') == 'success':
-            d = data['IPStack']
-            compiled.update({
-                'country': d.get('country'),
-                'region': d.get('regionName'),
-                'city': d.get('city'),
-                'latitude': d.get('lat'),
-                'longitude': d.get('lon'),
-                'timezone': d.get('timezone'),
-                'postal_code': d.get('zip'),
-                'isp': d.get('isp'),
-                'organization': d.get('org'),
-                'as_number': d.get('as', '').split(' ')[0] if d.get('as') else None,
-                'as_name': d.get('asname'),
-                'is_proxy': d.get('proxy', False),
-                'is_hosting': d.get('hosting', False),
-                'is_mobile': d.get('mobile', False),
-                'currency': d.get('currency')
-            })
-
-        # Process ipinfo.io data
-        if 'IPInfo' in data:
-            d = data['IPInfo']
-            if not compiled.get('country'):
-                compiled['country'] = d.get('country')
-            if not compiled.get('region'):
-                compiled['region'] = d.get('region')
-            if not compiled.get('city'):
-                compiled['city'] = d.get('city')
-            if not compiled.get('postal_code'):
-                compiled['postal_code'] = d.get('postal')
-            if not compiled.get('organization'):
-                compiled['organization'] = d.get('org')
-
-        return compiled
-
     def run(self):
         """Start the application"""
         self.root.mainloop()
 
 def main():
     """Main function to run the NWO Lookup Tool"""
+    trace_path = configure_from_env()
     try:
         app = NWOLookupTool()
         app.run()
@@ -369,6 +314,10 @@ def main():
         print("\nApplication terminated by user")
     except Exception as e:
         print(f"Application error: {e}")
+    finally:
+        if trace_path:
+            count = tracer.export_chrome(trace_path)
+            print(f"Wrote {count} trace events to {trace_path}")
 
 if __name__ == "__main__":
     main()
@@ -4,14 +4,25 @@ NWO IP Lookup Tool - Command Line Version
 A modern IP lookup tool with terminal-style interface using colorama
 """
 
-import requests
+import argparse
+import asyncio
 import json
 import ipaddress
+import re
+import queue
 import time
+import threading
 from datetime import datetime
 import sys
 import os
 
+from nwo_asn import ASNTable
+from nwo_core import LookupEngine, IP_API_FIELDS, IPINFO_FIELDS
+from nwo_ranges import parse_range, walk_prefixes
+from nwo_results import RESULT_FIELDS
+from nwo_trace import tracer, configure_from_env
+from nwo_watch import WatchState, load_watchlist, recheck
+
 try:
     from colorama import init, Fore, Back, Style
     init(autoreset=True)
@@ -24,8 +35,17 @@ except ImportError:
     class Style:
         BRIGHT = DIM = RESET_ALL = ""
 
+# Largest CIDR accepted at the interactive prompt
+MAX_INTERACTIVE_CIDR = 256
+
 class NWOLookupCLI:
-    def __init__(self):
+    def __init__(self, asn_table=None, fields=None, engine=None):
+        # Shared lookup engine; the CLI only renders its results
+        self.engine = engine or LookupEngine(asn_table=asn_table, fields=fields)
+        # Serializes terminal output when several lookups run concurrently
+        self._output_lock = threading.RLock()
+        # Counter for range scans
+        self.scan_lookups = 0
         self.colors = {
             'green': Fore.GREEN + Style.BRIGHT,
             'red': Fore.RED + Style.BRIGHT,
@@ -41,7 +61,8 @@ class NWOLookupCLI:
         """Print colored message to terminal"""
         timestamp = datetime.now().strftime('%H:%M:%S')
         color_code = self.colors.get(color, self.colors['white'])
-        print(f"{color_code}[{timestamp}] {message}{self.colors['reset']}")
+        with self._output_lock:
+            print(f"{color_code}[{timestamp}] {message}{self.colors['reset']}")
 
     def print_banner(self):
         """Print application banner"""
@@ -57,6 +78,14 @@ class NWOLookupCLI:
         """Print separator line"""
         print(f"{self.colors['white']}{char * length}{self.colors['reset']}")
 
+    @property
+    def fields(self):
+        return self.engine.fields
+
+    @property
+    def asn_table(self):
+        return self.engine.asn_table
+
     def validate_ip(self, ip_string):
         """Validate IP address format"""
         try:
@@ -65,46 +94,44 @@ class NWOLookupCLI:
         except ValueError:
             return False
 
-    def get_ip_info(self, ip):
+    def _provider_event(self, log):
+        """Return an engine event callback that reports provider progress through log"""
+        def on_event(event, provider, detail=None):
+            if event == 'query':
+                log(f"📡 Querying {provider} API...", "yellow")
+            elif event == 'success':
+                log(f"✅ {provider} - Success", "green")
+            elif event == 'status':
+                log(f"❌ {provider} - Error: {detail}", "red")
+            elif event == 'exception':
+                log(f"❌ {provider} - Exception: {str(detail)}", "red")
+            elif event == 'skipped':
+                log(f"⏭️ {provider} - Skipped, requested fields already answered", "cyan")
+        return on_event
+
+    def lookup(self, ip, verbose=True):
+        """Look up an IP through the engine and return its LookupResult"""
+        log = self.print_colored if verbose else (lambda message, color="white": None)
+        if verbose:
+            self.print_colored(f"🎯 Starting lookup for IP: {ip}", "cyan")
+            self.print_separator()
+        return self.engine.lookup_sync(ip, on_event=self._provider_event(log))
+
+    def get_ip_info(self, ip, verbose=True):
         """Get IP information from multiple APIs"""
-        self.print_colored(f"🎯 Starting lookup for IP: {ip}", "cyan")
-        self.print_separator()
+        return self.lookup(ip, verbose).raw
 
-        # Multiple API sources for comprehensive data
-        apis = [
-            {
-                'name': 'IP-API',
-                'url': f'http://ip-api.com/json/{ip}?fields=status,message,continent,continentCode,country,countryCode,region,regionName,city,district,zip,lat,lon,timezone,offset,currency,isp,org,as,asname,mobile,proxy,hosting,query',
-                'free': True
-            },
-            {
-                'name': 'IPInfo',
-                'url': f'https://ipinfo.io/{ip}/json',
-                'free': True
-            }
-        ]
-
-        all_data = {}
-
-        for api in apis:
-            try:
-                self.print_colored(f"📡 Querying {api['name']} API...", "yellow")
-                response = requests.get(api['url'], timeout=10)
-
-                if response.status_code == 200:
-                    data = response.json()
-                    all_data[api['name']] = data
-                    self.print_colored(f"✅ {api['name']} - Success", "green")
-                else:
-                    self.print_colored(f"❌ {api['name']} - Error: {response.status_code}", "red")
-
-            except Exception as e:
-                self.print_colored(f"❌ {api['name']} - Exception: {str(e)}", "red")
+    def display_results(self, ip, data, compiled=None):
+        """Display comprehensive IP lookup results
 
-        return all_data
+        Pass the LookupResult's ``compiled`` fields to avoid compiling the raw
+        responses a second time.
+        """
+        with tracer.span('render', ip=ip), self._output_lock:
+            self._render_results(ip, data, compiled)
 
-    def display_results(self, ip, data):
-        """Display comprehensive IP lookup results"""
+    def _render_results(self, ip, data, compiled_data=None):
+        """Render the analysis report to the terminal"""
         print()
         self.print_separator()
         self.print_colored("🎯 COMPREHENSIVE IP ANALYSIS REPORT", "cyan")
@@ -114,13 +141,13 @@ class NWOLookupCLI:
         self.print_colored("📍 BASIC INFORMATION", "yellow")
         self.print_colored(f"Target IP: {ip}", "white")
 
-        # Compile data from all sources
-        compiled_data = self._compile_data(data)
+        # Compile data from all sources unless the engine already did
+        if compiled_data is None:
+            with tracer.span('compile'):
+                compiled_data = self._compile_data(data, ip)
 
         if compiled_data:
             # Geographic Information
-            print()
-            self.print_colored("🌍 GEOGRAPHIC LOCATION", "yellow")
             geo_fields = [
                 ('country', 'Country'),
                 ('region', 'Region'),
@@ -132,33 +159,39 @@ class NWOLookupCLI:
                 ('continent', 'Continent')
             ]
 
+            if self._section_requested(geo_fields):
+                print()
+                self.print_colored("🌍 GEOGRAPHIC LOCATION", "yellow")
             for field, display_name in geo_fields:
                 if field in compiled_data and compiled_data[field]:
                     self.print_colored(f"{display_name}: {compiled_data[field]}", "white")
 
             # ISP Information
-            print()
-            self.print_colored("🏢 ISP & NETWORK INFORMATION", "yellow")
             isp_fields = [
                 ('isp', 'ISP'),
                 ('organization', 'Organization'),
                 ('as_number', 'AS Number'),
-                ('as_name', 'AS Name')
+                ('as_name', 'AS Name'),
+                ('as_prefix', 'Announced Prefix')
             ]
 
+            if self._section_requested(isp_fields):
+                print()
+                self.print_colored("🏢 ISP & NETWORK INFORMATION", "yellow")
             for field, display_name in isp_fields:
                 if field in compiled_data and compiled_data[field]:
                     self.print_colored(f"{display_name}: {compiled_data[field]}", "white")
 
             # Security Analysis
-            print()
-            self.print_colored("🔒 SECURITY ANALYSIS", "yellow")
             security_fields = [
                 ('is_proxy', 'Is Proxy'),
                 ('is_hosting', 'Is Hosting'),
                 ('is_mobile', 'Is Mobile')
             ]
 
+            if self._section_requested(security_fields):
+                print()
+                self.print_colored("🔒 SECURITY ANALYSIS", "yellow")
             for field, display_name in security_fields:
                 if field in compiled_data:
                     value = compiled_data[field]
@@ -166,14 +199,15 @@ class NWOLookupCLI:
                     self.print_colored(f"{display_name}: {value}", color)
 
             # Additional Information
-            print()
-            self.print_colored("💰 ADDITIONAL INFORMATION", "yellow")
             additional_fields = [
                 ('currency', 'Currency'),
                 ('country_code', 'Country Code'),
                 ('continent_code', 'Continent Code')
             ]
 
+            if self._section_requested(additional_fields):
+                print()
+                self.print_colored("💰 ADDITIONAL INFORMATION", "yellow")
             for field, display_name in additional_fields:
                 if field in compiled_data and compiled_data[field]:
                     self.print_colored(f"{display_name}: {compiled_data[field]}", "white")
@@ -188,12 +222,14 @@ class NWOLookupCLI:
                 self.print_colored(f"\n--- {api_name} ---", "cyan")
                 # Show only key fields to avoid clutter
                 if api_name == 'IP-API' and api_data.get('status') == 'success':
-                    key_fields = ['query', 'country', 'regionName', 'city', 'isp', 'org', 'as']
+                    key_fields = self._raw_key_fields(
+                        ['query', 'country', 'regionName', 'city', 'isp', 'org', 'as'], IP_API_FIELDS)
                     for field in key_fields:
                         if field in api_data:
                             self.print_colored(f"  {field}: {api_data[field]}", "white")
                 elif api_name == 'IPInfo':
-                    key_fields = ['ip', 'city', 'region', 'country', 'org', 'postal']
+                    key_fields = self._raw_key_fields(
+                        ['ip', 'city', 'region', 'country', 'org', 'postal'], IPINFO_FIELDS)
                     for field in key_fields:
                         if field in api_data:
                             self.print_colored(f"  {field}: {api_data[field]}", "white")
@@ -203,113 +239,439 @@ class NWOLookupCLI:
         self.print_colored("✅ ANALYSIS COMPLETE", "green")
         self.print_separator()
 
-    def _compile_data(self, data):
+    def _section_requested(self, section_fields):
+        """Check whether a report section has any field in the projection"""
+        return self.fields is None or any(field in self.fields for field, _ in section_fields)
+
+    def _raw_key_fields(self, key_fields, field_map):
+        """Limit raw response keys to those backing the projected fields"""
+        if self.fields is None:
+            return key_fields
+        keys = {field_map[field] for field in self.fields if field in field_map}
+        return [key for key in key_fields if key in keys]
+
+    def _compile_data(self, data, ip=None):
         """Compile data from multiple API sources"""
-        compiled = {}
-
-        # Process ip-api.com data
-        if 'IP-API' in data and data['IP-API'].get('status') == 'success':
-            d = data['IP-API']
-            compiled.update({
-                'country': d.get('country'),
-                'country_code': d.get('countryCode'),
-                'region': d.get('regionName'),
-                'city': d.get('city'),
-                'latitude': d.get('lat'),
-                'longitude': d.get('lon'),
-                'timezone': d.get('timezone'),
-                'postal_code': d.get('zip'),
-                'continent': d.get('continent'),
-                'continent_code': d.get('continentCode'),
-                'isp': d.get('isp'),
-                'organization': d.get('org'),
-                'as_number': d.get('as', '').split(' ')[0] if d.get('as') else None,
-                'as_name': d.get('asname'),
-                'is_proxy': d.get('proxy', False),
-                'is_hosting': d.get('hosting', False),
-                'is_mobile': d.get('mobile', False),
-                'currency': d.get('currency')
-            })
-
-        # Process ipinfo.io data (fill gaps)
-        if 'IPInfo' in data:
-            d = data['IPInfo']
-            if not compiled.get('country'):
-                compiled['country'] = d.get('country')
-            if not compiled.get('region'):
-                compiled['region'] = d.get('region')
-            if not compiled.get('city'):
-                compiled['city'] = d.get('city')
-            if not compiled.get('postal_code'):
-                compiled['postal_code'] = d.get('postal')
-            if not compiled.get('organization'):
-                compiled['organization'] = d.get('org')
-
-        return compiled
-
-    def interactive_mode(self):
-        """Run in interactive mode"""
+        return self.engine.compile(data, ip)
+
+    def lookup_result(self, ip):
+        """Look up an IP and return a compact IPResult, discarding raw responses"""
+        with tracer.span('lookup', ip=ip):
+            return self.lookup(ip, verbose=False).to_result()
+
+    def parse_targets(self, line):
+        """Split an input line into IP addresses
+
+        Accepts several IPs or CIDRs separated by spaces or commas. Returns
+        (targets, errors); CIDRs larger than MAX_INTERACTIVE_CIDR addresses
+        are rejected to avoid accidentally queueing a whole network.
+        """
+        targets, errors, seen = [], [], set()
+        for token in re.split(r'[\s,]+', line.strip()):
+            if not token:
+                continue
+            try:
+                if '/' in token:
+                    network = ipaddress.ip_network(token, strict=False)
+                    if network.num_addresses > MAX_INTERACTIVE_CIDR:
+                        errors.append(f"{token}: larger than {MAX_INTERACTIVE_CIDR} addresses")
+                        continue
+                    addresses = network.hosts() if network.num_addresses > 2 else iter(network)
+                else:
+                    addresses = [ipaddress.ip_address(token)]
+            except ValueError:
+                errors.append(f"{token}: invalid IP address or CIDR")
+                continue
+
+            for address in addresses:
+                address = str(address)
+                if address not in seen:
+                    seen.add(address)
+                    targets.append(address)
+        return targets, errors
+
+    async def _interactive_lookups(self, inbox, concurrency, session):
+        """Feed IPs queued by the prompt through lookup_many on one engine session"""
+        session['loop'] = asyncio.get_running_loop()
+        session['task'] = asyncio.current_task()
+        session['ready'].set()
+
+        async def targets():
+            while True:
+                ip = await asyncio.to_thread(inbox.get)
+                if ip is None:
+                    return
+                yield ip
+
+        def report(result):
+            with self._output_lock:
+                session['pending'] -= 1
+            try:
+                self.display_results(result.ip, result.raw, result.compiled)
+            except Exception as e:
+                self.print_colored(f"❌ Lookup for {result.ip} failed: {str(e)}", "red")
+
+        async with self.engine:
+            # Reports are rendered by on_result, inside each lookup's trace
+            async for _ in self.engine.lookup_many(targets(), concurrency, on_result=report):
+                pass
+
+    def _run_interactive_lookups(self, inbox, concurrency, session):
+        """Run the interactive lookup loop in its own thread"""
+        try:
+            self.engine.run_sync(self._interactive_lookups(inbox, concurrency, session))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.print_colored(f"❌ Lookup loop stopped: {str(e)}", "red")
+        finally:
+            session['ready'].set()
+
+    def interactive_mode(self, max_workers=8):
+        """Run in interactive mode
+
+        Lookups run on one long-lived event loop and HTTP session in a
+        background thread, at most ``max_workers`` at a time, so the prompt
+        keeps accepting input while earlier lookups are in flight; each
+        report is printed as soon as its lookup finishes.
+        """
         self.print_banner()
         self.print_colored("Welcome to NWO Lookup - IP Intelligence Tool", "green")
+        self.print_colored("Enter one or more IPs or CIDRs per line (space or comma separated)", "cyan")
         self.print_colored("Enter 'quit' or 'exit' to terminate the application", "cyan")
         print()
 
-        while True:
-            try:
-                # Get IP input
-                ip_input = input(f"{self.colors['yellow']}Enter IP address to lookup: {self.colors['reset']}").strip()
+        inbox = queue.Queue()
+        session = {'ready': threading.Event(), 'pending': 0}
+        worker = threading.Thread(target=self._run_interactive_lookups,
+                                  args=(inbox, max_workers, session),
+                                  name='nwo-lookup', daemon=True)
+        worker.start()
+        session['ready'].wait()
 
-                if ip_input.lower() in ['quit', 'exit', 'q']:
-                    self.print_colored("Goodbye! 👋", "cyan")
+        try:
+            while True:
+                try:
+                    # Get IP input
+                    ip_input = input(f"{self.colors['yellow']}Enter IP address(es) to lookup: {self.colors['reset']}").strip()
+
+                    if ip_input.lower() in ['quit', 'exit', 'q']:
+                        if session['pending']:
+                            self.print_colored(f"⏳ Waiting for {session['pending']} pending lookup(s)...", "yellow")
+                        inbox.put(None)
+                        worker.join()
+                        self.print_colored("Goodbye! 👋", "cyan")
+                        break
+
+                    if not ip_input:
+                        self.print_colored("Please enter a valid IP address", "red")
+                        continue
+
+                    targets, errors = self.parse_targets(ip_input)
+                    for error in errors:
+                        self.print_colored(f"Invalid input - {error}", "red")
+                    if not targets:
+                        continue
+
+                    with self._output_lock:
+                        session['pending'] += len(targets)
+                        pending = session['pending']
+                    for ip in targets:
+                        inbox.put(ip)
+                    self.print_colored(f"🎯 Queued {len(targets)} lookup(s), {pending} pending", "cyan")
+
+                except KeyboardInterrupt:
+                    print()
+                    self.print_colored("Application terminated by user", "yellow")
                     break
+                except EOFError:
+                    inbox.put(None)
+                    worker.join()
+                    break
+                except Exception as e:
+                    self.print_colored(f"An error occurred: {str(e)}", "red")
+        finally:
+            if worker.is_alive():
+                # Interrupted: stop reading input and cancel lookups in flight
+                inbox.put(None)
+                if 'task' in session:
+                    session['loop'].call_soon_threadsafe(session['task'].cancel)
+                worker.join()
+
+    def single_lookup(self, ip):
+        """Perform a single IP lookup"""
+        self.print_banner()
+
+        if not self.validate_ip(ip):
+            self.print_colored("Invalid IP address format", "red")
+            return False
 
-                if not ip_input:
-                    self.print_colored("Please enter a valid IP address", "red")
+        with tracer.span('lookup', ip=ip):
+            result = self.lookup(ip)
+            self.display_results(ip, result.raw, result.compiled)
+        return True
+
+    def scan_range(self, address_range):
+        """Attribute a range one announced prefix at a time
+
+        Walks the range from its first address, discovers the announced prefix
+        covering the current address, looks up a single representative
+        address for it and jumps past the prefix. Returns one row per prefix
+        with the address spans it covers; a covering prefix split by more
+        specific ones is looked up once and reported in a single row.
+
+        With --asn-db the table's flattened intervals stop at every more
+        specific prefix. RIPEstat only reports the most specific prefix for
+        the queried address, so without --asn-db a more specific prefix
+        announced inside a covering one further along is skipped over and
+        attributed to the covering prefix.
+        """
+        return self.engine.run_sync(self._scan_range(address_range))
+
+    async def _scan_range(self, address_range):
+        """Range walk over one engine connection pool"""
+        on_event = self._provider_event(self.print_colored)
+        rows = []
+        # prefix -> row; also caches the compiled lookup for the scan
+        by_prefix = {}
+
+        async def discover(address):
+            return await self.engine.discover_prefix(address, on_event)
+
+        async with self.engine:
+            async for first, last, prefix, asn in walk_prefixes(address_range, discover):
+                if prefix is None:
+                    rows.append({'prefix': None, 'spans': [(first, last)], 'data': {}})
                     continue
 
-                if not self.validate_ip(ip_input):
-                    self.print_colored("Invalid IP address format", "red")
+                row = by_prefix.get(prefix)
+                if row is not None:
+                    row['spans'].append((first, last))
                     continue
 
-                # Perform lookup
-                print()
-                data = self.get_ip_info(ip_input)
-                self.display_results(ip_input, data)
+                address = str(address_range.address(first))
+                with tracer.span('lookup', ip=address):
+                    result = await self.engine.lookup(address)
+                    self.scan_lookups += 1
+                    compiled = result.compiled
+                    fields = self.fields
+                    if fields is None or 'as_prefix' in fields:
+                        compiled.setdefault('as_prefix', prefix)
+                    if asn and not compiled.get('as_number') and (fields is None or 'as_number' in fields):
+                        compiled['as_number'] = asn
+                    row = by_prefix[prefix] = {'prefix': prefix, 'spans': [(first, last)], 'data': compiled}
+                    rows.append(row)
+                    with tracer.span('render', ip=address):
+                        self.print_colored(f"📡 {prefix} → {compiled.get('as_number') or 'unknown AS'}", "yellow")
+        return rows
+
+    def range_lookup(self, specs):
+        """Scan CIDRs and 'a-b' ranges and print per-prefix attribution"""
+        self.print_banner()
+        requests_before = self.engine.request_count
+        self.scan_lookups = 0
 
-                print()
-                self.print_colored("Lookup completed. Enter another IP or 'quit' to exit.", "green")
-                print()
+        for spec in specs:
+            try:
+                address_range = parse_range(spec)
+            except ValueError as e:
+                self.print_colored(f"Invalid range '{spec}': {str(e)}", "red")
+                continue
+
+            self.print_colored(f"🎯 Scanning {address_range} ({address_range.num_addresses} addresses)", "cyan")
+            self.print_separator()
+            rows = self.scan_range(address_range)
+            self.display_range_results(address_range, rows)
+
+        self.print_colored(f"📊 {self.scan_lookups} prefix lookup(s), "
+                           f"{self.engine.request_count - requests_before} upstream request(s)", "cyan")
+        return True
 
-            except KeyboardInterrupt:
-                print()
-                self.print_colored("Application terminated by user", "yellow")
-                break
-            except Exception as e:
-                self.print_colored(f"An error occurred: {str(e)}", "red")
+    def display_range_results(self, address_range, rows):
+        """Display aggregated per-prefix attribution for a scanned range"""
+        print()
+        self.print_separator()
+        self.print_colored(f"🎯 RANGE ATTRIBUTION REPORT - {address_range}", "cyan")
+        self.print_separator()
 
-    def single_lookup(self, ip):
-        """Perform a single IP lookup"""
+        for row in rows:
+            spans = ", ".join(f"{address_range.address(first)} - {address_range.address(last)}"
+                              for first, last in row['spans'])
+            count = sum(last - first + 1 for first, last in row['spans'])
+            label = row['prefix'] or "(unannounced)"
+            self.print_colored(f"{label}  [{spans}]  {count} address(es)", "white")
+
+            compiled = row['data']
+            if not compiled:
+                continue
+            details = [compiled.get(field) for field in ('as_number', 'as_name', 'country', 'isp')]
+            self.print_colored("  " + " | ".join(str(value) for value in details if value), "white")
+            flags = [name for field, name in (('is_hosting', 'hosting'), ('is_proxy', 'proxy'), ('is_mobile', 'mobile'))
+                     if compiled.get(field)]
+            if flags:
+                self.print_colored(f"  Flags: {', '.join(flags)}", "red")
+
+        print()
+        self.print_separator()
+        self.print_colored(f"✅ {len(rows)} block(s) attributed", "green")
+        self.print_separator()
+
+    def watch_mode(self, watchlist_path, interval=3600, state_path='nwo_watch_state.json', once=False):
+        """Re-check a watchlist every interval seconds and report only changes
+
+        Checks are spread evenly across the interval instead of bursting at
+        its start. State is saved after every cycle so restarts diff against
+        the last run.
+        """
         self.print_banner()
+        try:
+            ips = load_watchlist(watchlist_path)
+        except OSError as e:
+            self.print_colored(f"Cannot read watchlist: {str(e)}", "red")
+            return False
 
-        if not self.validate_ip(ip):
-            self.print_colored("Invalid IP address format", "red")
+        invalid = [ip for ip in ips if not self.validate_ip(ip)]
+        for ip in invalid:
+            self.print_colored(f"Skipping invalid IP in watchlist: {ip}", "red")
+        ips = [ip for ip in ips if ip not in invalid]
+        if not ips:
+            self.print_colored("Watchlist is empty", "red")
+            return False
+
+        try:
+            state = WatchState(state_path)
+        except (OSError, ValueError) as e:
+            self.print_colored(f"Cannot load watch state: {str(e)}", "red")
             return False
+        state.prune(ips)
+        spacing = interval / len(ips)
+        self.print_colored(f"👀 Watching {len(ips)} IP(s) every {interval}s "
+                           f"(one check every {spacing:.2f}s)", "cyan")
+        self.print_separator()
 
-        data = self.get_ip_info(ip)
-        self.display_results(ip, data)
+        try:
+            self.engine.run_sync(self._watch_loop(ips, state, interval, once))
+        except KeyboardInterrupt:
+            print()
+            self.print_colored("Watch stopped by user", "yellow")
+        finally:
+            state.save()
         return True
 
+    def _report_watch_result(self, ip, result, counts):
+        """Print one recheck outcome and count it"""
+        if isinstance(result, dict):
+            counts['changed'] += 1
+            self.print_colored(f"🔔 {ip} changed", "yellow")
+            for field, (old, new) in result.items():
+                self.print_colored(f"  {field}: {old} → {new}", "white")
+        else:
+            counts[result] += 1
+            if result == 'failed':
+                self.print_colored(f"⚠️ {ip} not checked: no provider answered", "red")
+
+    async def _watch_loop(self, ips, state, interval, once):
+        """Watch cycles over one engine connection pool"""
+        spacing = interval / len(ips)
+        on_event = self._provider_event(self.print_colored)
+
+        async with self.engine:
+            while True:
+                cycle_start = time.monotonic()
+                counts = {'baseline': 0, 'unchanged': 0, 'changed': 0, 'failed': 0}
+
+                for index, ip in enumerate(ips):
+                    delay = cycle_start + index * spacing - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                    with tracer.span('lookup', ip=ip):
+                        with tracer.span('watch.check', ip=ip):
+                            result = await recheck(self.engine, ip, state, on_event)
+                        with tracer.span('render', ip=ip):
+                            self._report_watch_result(ip, result, counts)
+
+                state.save()
+                self.print_colored(f"✅ Cycle complete: {counts['changed']} changed, "
+                                   f"{counts['unchanged']} unchanged, {counts['baseline']} new, "
+                                   f"{counts['failed']} failed", "green")
+                if once:
+                    break
+
+                remaining = cycle_start + interval - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="NWO Lookup - IP Intelligence Tool")
+    parser.add_argument('ip', nargs='?', help="IP address to look up (interactive mode if omitted)")
+    parser.add_argument('--fields', metavar='LIST',
+                        help="comma separated fields to fetch and report, e.g. country,as_number")
+    parser.add_argument('--range', metavar='SPEC', action='append', dest='ranges',
+                        help="scan a CIDR or 'a-b' range, one query per announced prefix (repeatable)")
+    parser.add_argument('--watch', metavar='FILE',
+                        help="re-check the IPs in FILE on a schedule and report only changes")
+    parser.add_argument('--interval', metavar='SECONDS', type=float, default=3600,
+                        help="watch mode re-check interval (default: 3600)")
+    parser.add_argument('--state', metavar='FILE', default='nwo_watch_state.json',
+                        help="watch mode state file (default: nwo_watch_state.json)")
+    parser.add_argument('--once', action='store_true',
+                        help="run a single watch cycle and exit")
+    parser.add_argument('--workers', metavar='N', type=int, default=8,
+                        help="concurrent lookups in interactive mode (default: 8)")
+    parser.add_argument('--asn-db', metavar='FILE',
+                        help="prefix-to-AS dump (plain or .gz) for offline ASN resolution")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="record per-stage timings and write Chrome trace-event JSON to FILE")
+    parser.add_argument('--trace-sample', metavar='RATE', type=float, default=1.0,
+                        help="fraction of lookups to trace, 0.0-1.0 (default: 1.0)")
+    args = parser.parse_args(argv)
+
+    if args.interval <= 0:
+        parser.error("--interval must be greater than 0")
+    if args.fields:
+        args.fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+        unknown = [field for field in args.fields if field not in RESULT_FIELDS]
+        if unknown:
+            parser.error(f"unknown field(s): {', '.join(unknown)} "
+                         f"(available: {', '.join(RESULT_FIELDS)})")
+        if 'as_prefix' in args.fields and not args.asn_db:
+            parser.error("field as_prefix requires --asn-db; no online provider reports it")
+    return args
+
 def main():
     """Main function"""
-    cli = NWOLookupCLI()
-
-    if len(sys.argv) > 1:
-        # Command line argument provided
-        ip = sys.argv[1]
-        cli.single_lookup(ip)
+    args = parse_args()
+
+    asn_table = None
+    if args.asn_db:
+        asn_table = ASNTable.load(args.asn_db)
+    cli = NWOLookupCLI(asn_table=asn_table, fields=args.fields)
+    if asn_table is not None:
+        cli.print_colored(f"🗂️ Loaded {len(asn_table)} ASN intervals from {args.asn_db}", "cyan")
+
+    trace_path = args.trace
+    if trace_path:
+        tracer.configure(enabled=True, sample_rate=args.trace_sample)
     else:
-        # Interactive mode
-        cli.interactive_mode()
+        trace_path = configure_from_env()
+
+    try:
+        if args.watch:
+            cli.watch_mode(args.watch, interval=args.interval, state_path=args.state, once=args.once)
+        elif args.ranges:
+            cli.range_lookup(args.ranges)
+        elif args.ip:
+            # Command line argument provided
+            cli.single_lookup(args.ip)
+        else:
+            # Interactive mode
+            cli.interactive_mode(max_workers=max(1, args.workers))
+    finally:
+        if trace_path:
+            count = tracer.export_chrome(trace_path)
+            cli.print_colored(f"📈 Wrote {count} trace events to {trace_path}", "cyan")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Address Ranges
+Parsing and lazy expansion of CIDR and 'a-b' range specifications
+"""
+
+import ipaddress
+
+# Block size assumed when no announced prefix can be discovered
+FALLBACK_PREFIXLEN = {4: 24, 6: 48}
+
+
+class AddressRange:
+    """Inclusive range of addresses within one address family
+
+    Addresses are never materialized up front; iterate to expand lazily or
+    use address() to convert an integer position back to an IP object.
+    """
+
+    def __init__(self, first, last):
+        if first.version != last.version:
+            raise ValueError("Range endpoints must share an address family")
+        if int(first) > int(last):
+            raise ValueError(f"Range start {first} is after range end {last}")
+        self.version = first.version
+        self.first = int(first)
+        self.last = int(last)
+        self._factory = ipaddress.IPv4Address if self.version == 4 else ipaddress.IPv6Address
+
+    @property
+    def num_addresses(self):
+        return self.last - self.first + 1
+
+    def address(self, value):
+        """Return the IP address object for an integer address"""
+        return self._factory(value)
+
+    def __iter__(self):
+        for value in range(self.first, self.last + 1):
+            yield self._factory(value)
+
+    def __str__(self):
+        first, last = self.address(self.first), self.address(self.last)
+        networks = list(ipaddress.summarize_address_range(first, last))
+        if len(networks) == 1:
+            return str(networks[0])
+        return f"{first}-{last}"
+
+
+def parse_range(spec):
+    """Parse a CIDR ('10.0.0.0/20'), range ('10.0.0.5-10.0.0.90') or single IP"""
+    spec = spec.strip()
+    if '-' in spec:
+        first, last = spec.split('-', 1)
+        return AddressRange(ipaddress.ip_address(first.strip()), ipaddress.ip_address(last.strip()))
+    if '/' in spec:
+        network = ipaddress.ip_network(spec, strict=False)
+        return AddressRange(network.network_address, network.broadcast_address)
+    address = ipaddress.ip_address(spec)
+    return AddressRange(address, address)
+
+
+def fallback_block(address):
+    """Return (first, last) integers of the /24 or /48 block containing address"""
+    network = ipaddress.ip_network(f"{address}/{FALLBACK_PREFIXLEN[address.version]}", strict=False)
+    return int(network.network_address), int(network.broadcast_address)
+
+
+async def walk_prefixes(address_range, discover):
+    """Walk a range one discovered block at a time
+
+    ``discover(address)`` is awaited with the IP object at the current
+    position and returns (first, last, prefix, asn) for the block covering
+    it; the walk then jumps past that block. Yields (first, last, prefix,
+    asn) spans clipped to the range in address order, with adjacent
+    unannounced spans (prefix None) merged into one.
+    """
+    cursor = address_range.first
+    gap = None
+    while cursor <= address_range.last:
+        first, last, prefix, asn = await discover(address_range.address(cursor))
+        last = max(cursor, min(last, address_range.last))
+        if prefix is None:
+            gap = (gap[0] if gap else cursor, last)
+        else:
+            if gap:
+                yield gap[0], gap[1], None, None
+                gap = None
+            yield cursor, last, prefix, asn
+        cursor = last + 1
+    if gap:
+        yield gap[0], gap[1], None, None
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Compact Result Storage
+Slotted per-IP result records and a columnar store for bulk filtering
+"""
+
+import ipaddress
+import math
+import sys
+from array import array
+
+# Fields produced by _compile_data, in display order
+RESULT_FIELDS = (
+    'country', 'country_code', 'region', 'city', 'latitude', 'longitude',
+    'timezone', 'postal_code', 'continent', 'continent_code', 'isp',
+    'organization', 'as_number', 'as_name', 'as_prefix', 'is_proxy',
+    'is_hosting', 'is_mobile', 'currency'
+)
+
+FLOAT_FIELDS = ('latitude', 'longitude')
+FLAG_FIELDS = ('is_proxy', 'is_hosting', 'is_mobile')
+CATEGORICAL_FIELDS = tuple(
+    field for field in RESULT_FIELDS
+    if field not in FLOAT_FIELDS and field not in FLAG_FIELDS
+)
+
+
+def _intern(value):
+    """Intern string values so repeated countries, ISPs and ASes share memory"""
+    if isinstance(value, str):
+        return sys.intern(value)
+    return value
+
+
+class IPResult:
+    """Compact lookup result for a single IP address"""
+
+    __slots__ = ('ip',) + RESULT_FIELDS
+
+    def __init__(self, ip, **fields):
+        self.ip = ip
+        for field in RESULT_FIELDS:
+            setattr(self, field, _intern(fields.get(field)))
+
+    @classmethod
+    def from_compiled(cls, ip, compiled):
+        """Build a result from the dict returned by _compile_data"""
+        return cls(ip, **{field: compiled.get(field) for field in RESULT_FIELDS})
+
+    def get(self, field, default=None):
+        """Dict-style access so results can stand in for compiled dicts"""
+        if field not in RESULT_FIELDS:
+            return default
+        value = getattr(self, field)
+        return default if value is None else value
+
+    def as_dict(self):
+        """Return the populated fields as a plain dict"""
+        return {
+            field: getattr(self, field)
+            for field in RESULT_FIELDS
+            if getattr(self, field) is not None
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, IPResult):
+            return NotImplemented
+        return self.ip == other.ip and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"IPResult({self.ip!r}, as_number={self.as_number!r}, country={self.country!r})"
+
+
+_FLAG_SET = frozenset((1,))
+
+
+def _select(data, accepted, candidates):
+    """Return indices whose column value is in accepted, optionally within candidates"""
+    if candidates is None:
+        return [i for i, value in enumerate(data) if value in accepted]
+    return [i for i in candidates if data[i] in accepted]
+
+
+class _CategoricalColumn:
+    """Dictionary-encoded string column; code 0 is reserved for missing values"""
+
+    def __init__(self):
+        self.codes = array('I')
+        self.values = [None]
+        self.index = {None: 0}
+
+    def append(self, value):
+        code = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            value = _intern(value)
+            self.values.append(value)
+            self.index[value] = code
+        self.codes.append(code)
+
+    def lookup_codes(self, wanted):
+        """Translate wanted values into the set of codes present in the column"""
+        return {self.index[value] for value in wanted if value in self.index}
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+
+class ResultStore:
+    """Columnar in-memory store of lookup results
+
+    Addresses are packed as 16-byte IPv6 (IPv4-mapped for IPv4), strings are
+    dictionary-encoded, coordinates are doubles and flags are signed bytes
+    (-1 when unknown). Filters scan the columns directly and return row
+    indices, so no per-IP dicts are built until rows are explicitly read.
+    """
+
+    def __init__(self, results=None):
+        self._ips = bytearray()
+        self._categorical = {field: _CategoricalColumn() for field in CATEGORICAL_FIELDS}
+        self._floats = {field: array('d') for field in FLOAT_FIELDS}
+        self._flags = {field: array('b') for field in FLAG_FIELDS}
+        self._count = 0
+
+        if results:
+            self.extend(results)
+
+    def __len__(self):
+        return self._count
+
+    def append(self, result):
+        """Add an IPResult (or anything with .ip and .get()) to the store"""
+        ip = ipaddress.ip_address(result.ip)
+        if ip.version == 4:
+            ip = ipaddress.IPv6Address(f"::ffff:{ip}")
+        self._ips += ip.packed
+
+        for field, column in self._categorical.items():
+            column.append(result.get(field))
+        for field, column in self._floats.items():
+            value = result.get(field)
+            column.append(math.nan if value is None else float(value))
+        for field, column in self._flags.items():
+            value = result.get(field)
+            column.append(-1 if value is None else int(bool(value)))
+
+        self._count += 1
+
+    def extend(self, results):
+        """Add several results to the store"""
+        for result in results:
+            self.append(result)
+
+    def add(self, ip, compiled):
+        """Add a result straight from a _compile_data dict"""
+        self.append(IPResult.from_compiled(ip, compiled))
+
+    def ip(self, row):
+        """Return the IP address string stored at a row"""
+        packed = bytes(self._ips[row * 16:(row + 1) * 16])
+        ip = ipaddress.IPv6Address(packed)
+        return str(ip.ipv4_mapped or ip)
+
+    def value(self, row, field):
+        """Return a single field value without materializing the row"""
+        if field == 'ip':
+            return self.ip(row)
+        if field in self._categorical:
+            return self._categorical[field][row]
+        if field in self._floats:
+            value = self._floats[field][row]
+            return None if math.isnan(value) else value
+        if field in self._flags:
+            value = self._flags[field][row]
+            return None if value < 0 else bool(value)
+        raise KeyError(field)
+
+    def row(self, row):
+        """Materialize one row as an IPResult"""
+        return IPResult(self.ip(row), **{field: self.value(row, field) for field in RESULT_FIELDS})
+
+    def rows(self, indices=None):
+        """Yield IPResult objects for the given row indices (all rows by default)"""
+        if indices is None:
+            indices = range(self._count)
+        for index in indices:
+            yield self.row(index)
+
+    def filter(self, any_flag=None, **criteria):
+        """Return row indices matching every criterion
+
+        Categorical and flag criteria take either a single value or a
+        list/tuple/set of accepted values. ``any_flag`` is a sequence of flag
+        fields of which at least one must be set, e.g.
+        ``store.filter(as_number='AS15169', any_flag=('is_hosting', 'is_proxy'))``.
+        """
+        candidates = None  # None means every row
+
+        for field, wanted in criteria.items():
+            if not isinstance(wanted, (list, tuple, set, frozenset)):
+                wanted = (wanted,)
+
+            if field in self._categorical:
+                column = self._categorical[field]
+                codes = column.lookup_codes(wanted)
+                if not codes:
+                    return []
+                candidates = _select(column.codes, codes, candidates)
+            elif field in self._flags:
+                accepted = {-1 if value is None else int(bool(value)) for value in wanted}
+                candidates = _select(self._flags[field], accepted, candidates)
+            else:
+                raise KeyError(f"Cannot filter on field: {field}")
+
+        if any_flag:
+            # Scan each flag column on its own and union the matching rows
+            matched = set()
+            for field in any_flag:
+                matched.update(_select(self._flags[field], _FLAG_SET, candidates))
+            candidates = sorted(matched)
+
+        return list(range(self._count)) if candidates is None else candidates
+
+    def count(self, any_flag=None, **criteria):
+        """Return the number of rows matching the filter criteria"""
+        return len(self.filter(any_flag=any_flag, **criteria))
+
+    def value_counts(self, field, indices=None):
+        """Return {value: count} for a categorical or flag field"""
+        if field in self._categorical:
+            column = self._categorical[field]
+            data, decode = column.codes, column.values.__getitem__
+        elif field in self._flags:
+            data = self._flags[field]
+            decode = lambda value: None if value < 0 else bool(value)
+        else:
+            raise KeyError(f"Cannot count field: {field}")
+
+        counts = {}
+        source = data if indices is None else (data[i] for i in indices)
+        for raw in source:
+            counts[raw] = counts.get(raw, 0) + 1
+        return {decode(raw): total for raw, total in counts.items()}
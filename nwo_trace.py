@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Stage Tracing
+Opt-in timing spans with Chrome trace-event JSON export
+"""
+
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+
+_NULL_SPAN = nullcontext()
+
+# (depth, sampled, tid) of the current trace; a context variable rather than
+# a thread-local so that concurrent asyncio tasks each see their own trace.
+# tid is fixed by the top-level span so one lookup stays on a single track.
+_STATE = ContextVar('nwo_trace_state', default=(0, False, None))
+
+
+def _current_tid():
+    """Thread id, or a per-task id inside asyncio so overlapping tasks get their own track"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+
+class _Span:
+    """Context manager recording one complete ('X') trace event"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start', 'depth', 'tid', 'token')
+
+    def __init__(self, tracer, name, args, depth, tid):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.depth = depth
+        self.tid = tid
+        self.start = 0
+        self.token = None
+
+    def __enter__(self):
+        self.token = _STATE.set((self.depth + 1, True, self.tid))
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer._record(self.name, self.start, end - self.start, self.args, self.tid)
+        _STATE.reset(self.token)
+        return False
+
+
+class _UnsampledSpan:
+    """Top-level span that lost the sampling roll; keeps nested spans quiet"""
+
+    __slots__ = ('token',)
+
+    def __init__(self):
+        self.token = None
+
+    def __enter__(self):
+        self.token = _STATE.set((1, False, None))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _STATE.reset(self.token)
+        return False
+
+
+class Tracer:
+    """Collects per-stage spans for lookups
+
+    Tracing is off by default. When enabled, each top-level span (one lookup)
+    is sampled with probability ``sample_rate``; all nested spans follow the
+    decision of their top-level span, so unsampled lookups cost one
+    context-variable check per stage. Events are kept in a bounded ring buffer
+    so leaving sampling on in production cannot grow memory without limit.
+    """
+
+    def __init__(self, enabled=False, sample_rate=1.0, max_events=100000):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.events = deque(maxlen=max_events)
+        self._epoch = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    def configure(self, enabled=True, sample_rate=None, max_events=None):
+        """Enable or disable tracing and adjust sampling"""
+        self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if max_events is not None:
+            self.events = deque(self.events, maxlen=max_events)
+
+    @property
+    def active(self):
+        """True when the current thread or task is inside a sampled trace"""
+        return self.enabled and _STATE.get()[1]
+
+    def span(self, name, **args):
+        """Return a context manager timing one stage
+
+        A span opened outside any other span starts a new trace and makes
+        the sampling decision for everything nested inside it.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+
+        depth, sampled, tid = _STATE.get()
+        if depth == 0:
+            if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+                return _UnsampledSpan()
+            return _Span(self, name, args, 0, _current_tid())
+
+        if not sampled:
+            return _NULL_SPAN
+        return _Span(self, name, args, depth, tid)
+
+    def add_span(self, name, start_ns, duration_ns, **args):
+        """Record a span measured elsewhere, e.g. from response.elapsed"""
+        if self.active:
+            self._record(name, start_ns, duration_ns, args, _STATE.get()[2])
+
+    def _record(self, name, start_ns, duration_ns, args, tid):
+        self.events.append({
+            'name': name,
+            'cat': name.split('.', 1)[0],
+            'ph': 'X',
+            'ts': (start_ns - self._epoch) / 1000,
+            'dur': duration_ns / 1000,
+            'pid': self._pid,
+            'tid': tid,
+            'args': args
+        })
+
+    def clear(self):
+        """Drop all recorded events"""
+        self.events.clear()
+
+    def to_chrome_trace(self):
+        """Return recorded events in Chrome trace-event format"""
+        return {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+    def export_chrome(self, path):
+        """Write recorded events as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
+        return len(self.events)
+
+
+# Shared tracer used by the CLI and GUI
+tracer = Tracer()
+
+
+async def probe_dns_async(url):
+    """Time name resolution for a URL's host inside a sampled trace
+
+    Used for the requests fallback, which does not expose DNS, connect and
+    server timings separately: sampled lookups resolve the host once up
+    front on the event loop's resolver, and the request that follows is
+    recorded as time-to-headers (connect, TLS and server time). With
+    aiohttp the session's trace hooks report each stage directly.
+    """
+    if not tracer.active:
+        return
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    with tracer.span('dns.resolve', host=parts.hostname):
+        try:
+            await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)
+        except OSError:
+            pass
+
+
+def configure_from_env():
+    """Enable tracing from NWO_TRACE / NWO_TRACE_SAMPLE; returns the export path or None"""
+    path = os.environ.get('NWO_TRACE')
+    if not path:
+        return None
+    tracer.configure(enabled=True, sample_rate=os.environ.get('NWO_TRACE_SAMPLE', 1.0))
+    return path
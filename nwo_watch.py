@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Watch State
+Persistent per-IP state and change detection for watch mode
+"""
+
+import hashlib
+import json
+import os
+
+from nwo_trace import tracer
+
+
+def load_watchlist(path):
+    """Read a watchlist file: one IP per line, '#' starts a comment"""
+    ips, seen = [], set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            ip = line.split('#', 1)[0].strip()
+            if ip and ip not in seen:
+                seen.add(ip)
+                ips.append(ip)
+    return ips
+
+
+def content_hash(data):
+    """Return a stable digest of raw response bytes or a JSON-serializable value"""
+    if not isinstance(data, (bytes, bytearray)):
+        data = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+def diff_compiled(old, new):
+    """Return {field: (old_value, new_value)} for fields that differ"""
+    old, new = old or {}, new or {}
+    changes = {}
+    for field in sorted(set(old) | set(new)):
+        if old.get(field) != new.get(field):
+            changes[field] = (old.get(field), new.get(field))
+    return changes
+
+
+class WatchState:
+    """Previous lookup state per IP, persisted as JSON
+
+    Each entry keeps, per provider, the ETag and body hash of the last 200
+    response together with its decoded data, plus the compiled result and
+    its hash. Unchanged providers can then be skipped via 304 responses or
+    matching body hashes without decoding or recompiling anything.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                try:
+                    entries = json.load(f)
+                except ValueError as e:
+                    raise ValueError(f"Corrupt watch state file {path}: {e}") from e
+            if not isinstance(entries, dict):
+                raise ValueError(f"Corrupt watch state file {path}: expected a JSON object")
+            self.entries = entries
+
+    def get(self, ip):
+        return self.entries.get(ip)
+
+    def set(self, ip, providers, compiled):
+        self.entries[ip] = {
+            'providers': providers,
+            'compiled': compiled,
+            'compiled_hash': content_hash(compiled)
+        }
+
+    def prune(self, ips):
+        """Drop entries for IPs no longer on the watchlist"""
+        keep = set(ips)
+        for ip in list(self.entries):
+            if ip not in keep:
+                del self.entries[ip]
+
+    def save(self):
+        """Write the state atomically"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+async def recheck(engine, ip, state, on_event=None):
+    """Re-check one watched IP against its stored state
+
+    Providers are queried with If-None-Match when an ETag is known; a 304
+    or an identical body hash skips JSON decoding for that provider. Only
+    when a provider changed is the result recompiled and diffed. Returns
+    'baseline', 'unchanged', 'failed' (no provider answered; nothing is
+    stored) or a {field: (old, new)} dict of changes.
+    """
+    entry = state.get(ip)
+    providers = dict(entry['providers']) if entry else {}
+    changed = answered = False
+
+    for api in engine.provider_apis(ip):
+        if 'fills' in api and engine.gaps_answered(
+                {name: p['data'] for name, p in providers.items()}, api['fills']):
+            if on_event:
+                on_event('skipped', api['name'])
+            continue
+        previous = providers.get(api['name'])
+        headers = {}
+        if previous and previous.get('etag'):
+            headers['If-None-Match'] = previous['etag']
+        try:
+            response = await engine.fetch(api['url'], headers=headers)
+        except Exception as e:
+            if on_event:
+                on_event('exception', api['name'], e)
+            continue
+
+        # Keep the previous provider state on 304 and on errors
+        if response.status == 304:
+            answered = True
+            continue
+        if response.status != 200:
+            if on_event:
+                on_event('status', api['name'], response.status)
+            continue
+        answered = True
+        digest = content_hash(response.body)
+        if previous and previous.get('hash') == digest:
+            continue
+
+        providers[api['name']] = {
+            'etag': response.headers.get('etag'),
+            'hash': digest,
+            'data': response.json()
+        }
+        changed = True
+
+    if not answered:
+        # An outage must not become the baseline later answers are diffed against
+        return 'failed'
+    if entry and not changed:
+        return 'unchanged'
+
+    with tracer.span('compile'):
+        compiled = engine.compile({name: p['data'] for name, p in providers.items()}, ip)
+
+    if not entry:
+        state.set(ip, providers, compiled)
+        return 'baseline'
+    if content_hash(compiled) == entry.get('compiled_hash'):
+        # Raw responses changed, compiled result did not
+        state.set(ip, providers, entry['compiled'])
+        return 'unchanged'
+
+    changes = diff_compiled(entry['compiled'], compiled)
+    state.set(ip, providers, compiled)
+    return changes
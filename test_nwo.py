@@ -0,0 +1,568 @@
+#!/usr/bin/env python3
+"""
+NWO IP Lookup Tool - Tests
+Behavior tests that run without network access
+"""
+
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from nwo_asn import ASNTable
+from nwo_ranges import parse_range, walk_prefixes
+from nwo_results import IPResult, ResultStore
+from nwo_trace import Tracer
+from nwo_watch import WatchState, diff_compiled, recheck
+
+try:
+    import nwo_core
+    import nwo_lookup_cli
+except ImportError:  # requests is not installed
+    nwo_core = nwo_lookup_cli = None
+
+needs_core = unittest.skipIf(nwo_core is None, "requests is not installed")
+
+
+def _store():
+    return ResultStore([
+        IPResult('192.0.2.1', as_number='AS64500', country='US', is_hosting=True, latitude=30.27),
+        IPResult('192.0.2.2', as_number='AS64500', country='DE', is_proxy=True, is_hosting=False),
+        IPResult('2001:db8::1', as_number='AS64501', country='US', is_hosting=False, is_proxy=False),
+        IPResult('198.51.100.7', as_number='AS64502')
+    ])
+
+
+class ResultStoreTest(unittest.TestCase):
+
+    def test_ip_result_round_trip(self):
+        compiled = {'country': 'US', 'as_number': 'AS64500', 'is_proxy': False, 'unknown': 1}
+        result = IPResult.from_compiled('192.0.2.1', compiled)
+        self.assertEqual(result.as_dict(), {'country': 'US', 'as_number': 'AS64500', 'is_proxy': False})
+        self.assertEqual(result.get('city', 'n/a'), 'n/a')
+        self.assertEqual(result.get('unknown', 'n/a'), 'n/a')
+        self.assertEqual(result, IPResult('192.0.2.1', country='US', as_number='AS64500', is_proxy=False))
+
+    def test_rows_round_trip_including_ipv6_and_missing_values(self):
+        store = _store()
+        self.assertEqual(len(store), 4)
+        self.assertEqual(store.ip(2), '2001:db8::1')
+        self.assertEqual(store.row(0), IPResult('192.0.2.1', as_number='AS64500', country='US',
+                                                is_hosting=True, latitude=30.27))
+        self.assertIsNone(store.value(3, 'country'))
+        self.assertIsNone(store.value(3, 'is_hosting'))
+        self.assertIsNone(store.value(3, 'latitude'))
+        self.assertEqual([result.ip for result in store.rows([3, 1])], ['198.51.100.7', '192.0.2.2'])
+
+    def test_filter(self):
+        store = _store()
+        self.assertEqual(store.filter(country='US'), [0, 2])
+        self.assertEqual(store.filter(as_number=['AS64500', 'AS64502']), [0, 1, 3])
+        self.assertEqual(store.filter(country='US', as_number='AS64501'), [2])
+        self.assertEqual(store.filter(is_hosting=False), [1, 2])
+        self.assertEqual(store.filter(is_hosting=None), [3])
+        self.assertEqual(store.filter(country='FR'), [])
+        self.assertEqual(store.filter(), [0, 1, 2, 3])
+        with self.assertRaises(KeyError):
+            store.filter(latitude=1.0)
+
+    def test_filter_any_flag(self):
+        store = _store()
+        self.assertEqual(store.filter(any_flag=('is_hosting', 'is_proxy')), [0, 1])
+        self.assertEqual(store.filter(as_number='AS64500', any_flag=('is_proxy',)), [1])
+        self.assertEqual(store.count(any_flag=('is_mobile',)), 0)
+
+    def test_value_counts(self):
+        store = _store()
+        self.assertEqual(store.value_counts('as_number'), {'AS64500': 2, 'AS64501': 1, 'AS64502': 1})
+        self.assertEqual(store.value_counts('country', store.filter(as_number='AS64500')),
+                         {'US': 1, 'DE': 1})
+        self.assertEqual(store.value_counts('is_hosting'), {True: 1, False: 2, None: 1})
+        with self.assertRaises(KeyError):
+            store.value_counts('latitude')
+
+
+class TracerTest(unittest.TestCase):
+
+    def test_disabled_tracer_records_nothing(self):
+        tracer = Tracer()
+        with tracer.span('lookup'):
+            tracer.add_span('http.headers', 0, 1)
+        self.assertEqual(len(tracer.events), 0)
+
+    def test_nested_spans_follow_the_top_level_sampling_decision(self):
+        tracer = Tracer(enabled=True, sample_rate=0.5)
+        with mock.patch('nwo_trace.random.random', side_effect=[0.1, 0.9]):
+            for ip in ('192.0.2.1', '192.0.2.2'):
+                with tracer.span('lookup', ip=ip):
+                    with tracer.span('compile'):
+                        tracer.add_span('http.headers', 0, 1)
+                        self.assertEqual(tracer.active, ip == '192.0.2.1')
+        self.assertEqual([event['name'] for event in tracer.events], ['http.headers', 'compile', 'lookup'])
+        self.assertEqual(tracer.events[-1]['args'], {'ip': '192.0.2.1'})
+        self.assertFalse(tracer.active)
+
+    def test_spans_outside_a_trace_are_not_recorded(self):
+        tracer = Tracer(enabled=True)
+        tracer.add_span('http.headers', 0, 1)
+        self.assertEqual(len(tracer.events), 0)
+
+    def test_one_lookup_stays_on_one_track_across_thread_and_task(self):
+        tracer = Tracer(enabled=True)
+
+        async def nested():
+            with tracer.span('engine.lookup'):
+                await asyncio.sleep(0)
+
+        with tracer.span('lookup'):
+            asyncio.run(nested())
+        self.assertEqual(len({event['tid'] for event in tracer.events}), 1)
+
+    def test_chrome_export(self):
+        tracer = Tracer(enabled=True, max_events=2)
+        for name in ('first', 'second', 'third'):
+            with tracer.span(name):
+                pass
+        with self.assertRaises(ValueError):
+            with tracer.span('failing'):
+                raise ValueError('boom')
+
+        trace = tracer.to_chrome_trace()
+        self.assertEqual([event['name'] for event in trace['traceEvents']], ['third', 'failing'])
+        event = trace['traceEvents'][-1]
+        self.assertEqual((event['ph'], event['cat'], event['args']), ('X', 'failing', {'error': 'ValueError'}))
+        self.assertGreaterEqual(event['dur'], 0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            self.assertEqual(tracer.export_chrome(path), 2)
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), trace)
+
+
+def _table(*lines):
+    table = ASNTable()
+    for line in lines:
+        table.add_line(line)
+    table.build()
+    return table
+
+
+def _intervals(table, version=4):
+    family = table._tables[version]
+    return list(zip(family.starts, family.ends, (record.prefix for record in family.records)))
+
+
+class ASNFlatteningTest(unittest.TestCase):
+
+    def test_nested_prefix_splits_covering_prefix(self):
+        table = _table('10.0.0.0/8 64500 BIG', '10.1.0.0/16 64501 SMALL')
+        self.assertEqual(table.lookup('10.0.255.255').as_number, 'AS64500')
+        self.assertEqual(table.lookup('10.1.2.3').as_number, 'AS64501')
+        self.assertEqual(table.lookup('10.2.0.0').as_number, 'AS64500')
+        self.assertEqual([prefix for _, _, prefix in _intervals(table)],
+                         ['10.0.0.0/8', '10.1.0.0/16', '10.0.0.0/8'])
+
+        first, last, match = table.lookup_interval('10.200.0.1')
+        self.assertEqual(match.prefix, '10.0.0.0/8')
+        self.assertEqual(first, parse_range('10.2.0.0').first)
+        self.assertEqual(last, parse_range('10.255.255.255').first)
+
+    def test_deeply_nested_prefixes(self):
+        table = _table('10.0.0.0/8 1', '10.1.0.0/16 2', '10.1.1.0/24 3')
+        self.assertEqual(table.lookup('10.1.1.1').as_number, 'AS3')
+        self.assertEqual(table.lookup('10.1.2.1').as_number, 'AS2')
+        self.assertEqual(table.lookup('10.3.0.0').as_number, 'AS1')
+        self.assertEqual(len(table), 5)
+
+    def test_overlapping_ranges_do_not_overlap_after_flattening(self):
+        table = _table('1.0.0.0\t1.0.0.255\t100\tUS\tFIRST',
+                       '1.0.0.128\t1.0.1.255\t200\tUS\tSECOND')
+        intervals = _intervals(table)
+        for (_, end, _), (start, _, _) in zip(intervals, intervals[1:]):
+            self.assertLess(end, start)
+        self.assertEqual(table.lookup('1.0.0.1').as_number, 'AS100')
+        self.assertEqual(table.lookup('1.0.0.200').as_number, 'AS200')
+        self.assertEqual(table.lookup('1.0.1.0').as_number, 'AS200')
+
+    def test_duplicate_prefix_keeps_one_interval(self):
+        table = _table('192.0.2.0/24 64500 OLD', '192.0.2.0/24 64501 NEW')
+        self.assertEqual(len(table), 1)
+        self.assertEqual(table.lookup('192.0.2.1').as_number, 'AS64501')
+
+    def test_as0_ranges_are_skipped(self):
+        table = ASNTable()
+        self.assertFalse(table.add_line('1.0.0.0\t1.0.0.255\t0\tNone\tNot routed'))
+        self.assertTrue(table.add_line('1.0.1.0\t1.0.1.255\t13335\tUS\tCLOUDFLARENET'))
+        table.build()
+        self.assertIsNone(table.lookup('1.0.0.1'))
+        self.assertEqual(table.lookup('1.0.1.1').as_name, 'CLOUDFLARENET')
+        self.assertEqual(table.next_start('1.0.0.1'), parse_range('1.0.1.0').first)
+
+    def test_ipv6_and_ipv4_mapped_addresses(self):
+        table = _table('2001:db8::/32 64496', '192.0.2.0/24 64500')
+        self.assertEqual(table.lookup('2001:db8::1').as_number, 'AS64496')
+        self.assertEqual(table.lookup('::ffff:192.0.2.7').as_number, 'AS64500')
+        self.assertIsNone(table.lookup('2001:db9::1'))
+
+
+if nwo_core is not None:
+    class _StubEngine(nwo_core.LookupEngine):
+        """LookupEngine whose lookups answer from memory instead of the network"""
+
+        async def _lookup(self, transport, ip, on_event=None):
+            await asyncio.sleep(0)
+            return nwo_core.LookupResult(ip, {'country': 'US'}, {}, {}, 0.0)
+
+
+@needs_core
+class InteractiveModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cli = nwo_lookup_cli.NWOLookupCLI(engine=_StubEngine())
+
+    def test_parse_targets_splits_on_commas_and_spaces_and_dedups(self):
+        targets, errors = self.cli.parse_targets(' 8.8.8.8,1.1.1.1  8.8.8.8 ,, 2001:db8::1 ')
+        self.assertEqual(targets, ['8.8.8.8', '1.1.1.1', '2001:db8::1'])
+        self.assertEqual(errors, [])
+
+    def test_parse_targets_expands_small_cidrs(self):
+        targets, errors = self.cli.parse_targets('192.0.2.0/30 192.0.2.1 198.51.100.0/31')
+        self.assertEqual(targets, ['192.0.2.1', '192.0.2.2', '198.51.100.0', '198.51.100.1'])
+        self.assertEqual(errors, [])
+
+    def test_parse_targets_caps_cidr_size_and_reports_invalid_input(self):
+        targets, errors = self.cli.parse_targets('10.0.0.0/23 bogus 10.0.1.0/24')
+        self.assertEqual(len(targets), 254)
+        self.assertEqual(len(errors), 2)
+        self.assertIn('10.0.0.0/23', errors[0])
+        self.assertIn('bogus', errors[1])
+
+    def test_report_is_rendered_before_next_line_is_read(self):
+        rendered, reports = threading.Event(), []
+
+        def display_results(ip, data, compiled=None):
+            reports.append((ip, compiled))
+            rendered.set()
+
+        self.cli.display_results = display_results
+        inbox = queue.Queue()
+        session = {'ready': threading.Event(), 'pending': 1}
+        worker = threading.Thread(target=self.cli._run_interactive_lookups, args=(inbox, 8, session))
+        worker.start()
+        try:
+            self.assertTrue(session['ready'].wait(2))
+            inbox.put('192.0.2.1')
+            # Nothing else is queued: the report must not wait for more input
+            self.assertTrue(rendered.wait(2))
+        finally:
+            inbox.put(None)
+            worker.join(2)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(reports, [('192.0.2.1', {'country': 'US'})])
+        self.assertEqual(session['pending'], 0)
+
+
+def _table_discover(table, calls=None):
+    """Prefix discovery backed by an ASN table, as the engine does with --asn-db"""
+    async def discover(address):
+        if calls is not None:
+            calls.append(str(address))
+        interval = table.lookup_interval(address)
+        if interval:
+            first, last, match = interval
+            return first, last, match.prefix, match.as_number
+        next_start = table.next_start(address)
+        if next_start is None:
+            next_start = 2 ** address.max_prefixlen
+        return int(address), next_start - 1, None, None
+    return discover
+
+
+def _walk(address_range, discover):
+    async def collect():
+        return [span async for span in walk_prefixes(address_range, discover)]
+    return asyncio.run(collect())
+
+
+class RangeWalkTest(unittest.TestCase):
+
+    def test_walk_visits_each_interval_once(self):
+        table = _table('10.0.0.0/8 64500', '10.1.0.0/16 64501')
+        calls = []
+        spans = _walk(parse_range('10.0.0.0/14'), _table_discover(table, calls))
+        self.assertEqual([(prefix, asn) for _, _, prefix, asn in spans],
+                         [('10.0.0.0/8', 'AS64500'), ('10.1.0.0/16', 'AS64501'),
+                          ('10.0.0.0/8', 'AS64500')])
+        self.assertEqual(calls, ['10.0.0.0', '10.1.0.0', '10.2.0.0'])
+
+    def test_spans_are_clipped_and_contiguous(self):
+        table = _table('10.0.0.0/8 64500')
+        address_range = parse_range('10.0.0.5-10.0.0.90')
+        spans = _walk(address_range, _table_discover(table))
+        self.assertEqual(spans, [(address_range.first, address_range.last, '10.0.0.0/8', 'AS64500')])
+
+    def test_adjacent_unannounced_spans_are_merged(self):
+        address_range = parse_range('192.0.2.0/24')
+
+        async def discover(address):
+            # Unannounced /26 blocks, except for 192.0.2.128/26
+            start = int(address) & ~63
+            prefix = '192.0.2.128/26' if str(address) == '192.0.2.128' else None
+            return start, start + 63, prefix, None
+
+        spans = _walk(address_range, discover)
+        self.assertEqual([(last - first + 1, prefix) for first, last, prefix, _ in spans],
+                         [(128, None), (64, '192.0.2.128/26'), (64, None)])
+
+    @needs_core
+    def test_ripestat_prefix_not_covering_address_falls_back_to_block(self):
+        for wrong_prefix in ('10.0.0.0/24', '198.51.100.0/24'):
+            requested = []
+
+            class Engine(nwo_core.LookupEngine):
+                async def _get(self, transport, url, headers=None):
+                    requested.append(url)
+                    body = json.dumps({'data': {'prefix': wrong_prefix, 'asns': [64500]}})
+                    return nwo_core.ProviderResponse(200, body.encode('utf-8'), {}, 0.0)
+
+            spans = _walk(parse_range('192.0.2.0/24'), Engine().discover_prefix)
+            self.assertEqual(len(requested), 1)
+            self.assertEqual([(last - first + 1, prefix) for first, last, prefix, _ in spans],
+                             [(256, None)])
+
+    @needs_core
+    def test_scan_rows_respect_field_projection(self):
+        class Engine(_StubEngine):
+            async def _discover_prefix(self, transport, address, on_event=None):
+                return int(address) & ~255, int(address) | 255, '192.0.2.0/24', 'AS64500'
+
+        cli = nwo_lookup_cli.NWOLookupCLI(engine=Engine(fields=['country']))
+        rows = cli.scan_range(parse_range('192.0.2.0/24'))
+        self.assertEqual([row['data'] for row in rows], [{'country': 'US'}])
+
+        cli = nwo_lookup_cli.NWOLookupCLI(engine=Engine())
+        rows = cli.scan_range(parse_range('192.0.2.0/24'))
+        self.assertEqual(rows[0]['data'], {'country': 'US', 'as_prefix': '192.0.2.0/24',
+                                           'as_number': 'AS64500'})
+
+    def test_single_address_range(self):
+        address_range = parse_range('198.51.100.7')
+        spans = _walk(address_range, _table_discover(ASNTable()))
+        self.assertEqual(spans, [(address_range.first, address_range.first, None, None)])
+
+
+class _Response:
+
+    def __init__(self, status, payload=None, etag=None):
+        self.status = status
+        self.body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.headers = {'etag': etag} if etag else {}
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class _Engine:
+    """Single-provider stand-in for LookupEngine"""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def provider_apis(self, ip):
+        return [{'name': 'IP-API', 'url': f'http://ip-api.test/{ip}'}]
+
+    async def fetch(self, url, headers=None):
+        self.requests.append(headers or {})
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def compile(self, data, ip=None):
+        d = data.get('IP-API', {})
+        return {'country': d.get('country'), 'is_hosting': d.get('hosting', False)}
+
+
+class WatchDiffTest(unittest.TestCase):
+
+    def test_diff_compiled(self):
+        old = {'country': 'US', 'is_hosting': False, 'city': 'Austin'}
+        new = {'country': 'US', 'is_hosting': True, 'as_number': 'AS64500'}
+        self.assertEqual(diff_compiled(old, new), {
+            'as_number': (None, 'AS64500'),
+            'city': ('Austin', None),
+            'is_hosting': (False, True)
+        })
+        self.assertEqual(diff_compiled(old, dict(old)), {})
+        self.assertEqual(diff_compiled(None, {'country': 'US'}), {'country': (None, 'US')})
+
+    def test_recheck_baseline_unchanged_and_changed(self):
+        engine, state = _Engine(), WatchState(None)
+        check = lambda: asyncio.run(recheck(engine, '192.0.2.1', state))
+
+        engine.responses.append(_Response(200, {'country': 'US'}, etag='"v1"'))
+        self.assertEqual(check(), 'baseline')
+
+        # 304 keeps the stored provider state and sends the known ETag
+        engine.responses.append(_Response(304))
+        self.assertEqual(check(), 'unchanged')
+        self.assertEqual(engine.requests[-1], {'If-None-Match': '"v1"'})
+
+        # Identical body without an ETag match is skipped by hash
+        engine.responses.append(_Response(200, {'country': 'US'}, etag='"v2"'))
+        self.assertEqual(check(), 'unchanged')
+
+        # A changed body that compiles the same is not reported
+        engine.responses.append(_Response(200, {'country': 'US', 'query': '192.0.2.1'}))
+        self.assertEqual(check(), 'unchanged')
+
+        engine.responses.append(_Response(200, {'country': 'US', 'hosting': True}))
+        self.assertEqual(check(), {'is_hosting': (False, True)})
+        self.assertTrue(state.get('192.0.2.1')['compiled']['is_hosting'])
+
+    def test_outage_on_first_check_records_no_baseline(self):
+        engine, state, events = _Engine(), WatchState(None), []
+        check = lambda: asyncio.run(recheck(engine, '192.0.2.1', state,
+                                            lambda *event: events.append(event)))
+
+        engine.responses.append(_Response(503))
+        self.assertEqual(check(), 'failed')
+        self.assertIsNone(state.get('192.0.2.1'))
+        self.assertEqual(events, [('status', 'IP-API', 503)])
+
+        engine.responses.append(OSError('timed out'))
+        self.assertEqual(check(), 'failed')
+        self.assertEqual(events[-1][:2], ('exception', 'IP-API'))
+
+        engine.responses.append(_Response(200, {'country': 'US'}))
+        self.assertEqual(check(), 'baseline')
+
+        # A later outage is reported, not mistaken for an unchanged result
+        engine.responses.append(_Response(500))
+        self.assertEqual(check(), 'failed')
+        self.assertEqual(state.get('192.0.2.1')['compiled']['country'], 'US')
+
+    @needs_core
+    def test_projected_recheck_skips_answered_gap_provider(self):
+        fetched, events = [], []
+
+        class Engine(nwo_core.LookupEngine):
+            async def fetch(self, url, headers=None):
+                fetched.append(url)
+                return _Response(200, {'status': 'success', 'country': 'US', 'city': 'Austin'})
+
+        engine, state = Engine(fields=['country', 'city']), WatchState(None)
+        result = asyncio.run(recheck(engine, '192.0.2.1', state, lambda *event: events.append(event)))
+        self.assertEqual(result, 'baseline')
+        self.assertEqual(len(fetched), 1)
+        self.assertIn('ip-api.com', fetched[0])
+        self.assertIn(('skipped', 'IPInfo'), events)
+        self.assertEqual(state.get('192.0.2.1')['compiled'], {'country': 'US', 'city': 'Austin'})
+
+    def test_corrupt_state_file_raises_value_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('{not json')
+            with self.assertRaises(ValueError):
+                WatchState(path)
+
+
+IP_API_ANSWER = {
+    'status': 'success', 'country': 'United States', 'countryCode': 'US', 'city': '',
+    'as': 'AS64500 Example Networks', 'asname': 'EXAMPLE', 'hosting': True, 'lat': 30.27
+}
+
+
+@needs_core
+class LookupEngineTest(unittest.TestCase):
+
+    def test_provider_apis_without_projection(self):
+        apis = nwo_core.LookupEngine().provider_apis('192.0.2.1')
+        self.assertEqual([api['name'] for api in apis], ['IP-API', 'IPInfo'])
+        self.assertNotIn('fills', apis[1])
+
+    def test_provider_apis_push_projection_down(self):
+        apis = nwo_core.LookupEngine(fields=['country', 'as_number', 'latitude']).provider_apis('192.0.2.1')
+        self.assertEqual(apis[0]['url'], 'http://ip-api.com/json/192.0.2.1?fields=status,message,as,country,lat')
+        self.assertEqual((apis[1]['name'], apis[1]['fills']), ('IPInfo', ['country']))
+
+        apis = nwo_core.LookupEngine(fields=['latitude']).provider_apis('192.0.2.1')
+        self.assertEqual([api['name'] for api in apis], ['IP-API'])
+
+    def test_asn_table_answers_as_fields_without_providers(self):
+        table = _table('192.0.2.0/24 64500 EXAMPLE')
+        engine = nwo_core.LookupEngine(asn_table=table, fields=['as_number', 'as_name', 'as_prefix'])
+        self.assertEqual(engine.provider_apis('192.0.2.1'), [])
+        self.assertEqual(len(engine.provider_apis('198.51.100.1')), 1)
+
+    def test_compile_merges_providers(self):
+        compiled = nwo_core.LookupEngine().compile(
+            {'IP-API': IP_API_ANSWER, 'IPInfo': {'city': 'Austin', 'country': 'XX'}}, '192.0.2.1')
+        self.assertEqual(compiled['country'], 'United States')
+        self.assertEqual(compiled['city'], 'Austin')
+        self.assertEqual(compiled['as_number'], 'AS64500')
+        self.assertIs(compiled['is_hosting'], True)
+        self.assertIs(compiled['is_proxy'], False)
+        self.assertEqual(nwo_core.LookupEngine().compile({'IP-API': {'status': 'fail'}}), {})
+
+    def test_compile_applies_projection_and_asn_table(self):
+        table = _table('192.0.2.0/24 64999 TABLE')
+        engine = nwo_core.LookupEngine(asn_table=table, fields=['country', 'as_number'])
+        compiled = engine.compile({'IP-API': IP_API_ANSWER}, '192.0.2.1')
+        self.assertEqual(compiled, {'country': 'United States', 'as_number': 'AS64999'})
+
+        engine = nwo_core.LookupEngine(asn_table=table)
+        compiled = engine.compile({'IP-API': IP_API_ANSWER}, '192.0.2.1')
+        self.assertEqual((compiled['as_name'], compiled['as_prefix']), ('TABLE', '192.0.2.0/24'))
+
+    def test_lookup_skips_gap_provider_and_records_errors(self):
+        answers = {'ip-api.com': (200, IP_API_ANSWER), 'ipinfo.io': (503, None)}
+
+        class Engine(nwo_core.LookupEngine):
+            async def _get(self, transport, url, headers=None):
+                self.request_count += 1
+                status, payload = next(answer for host, answer in answers.items() if host in url)
+                return nwo_core.ProviderResponse(status, json.dumps(payload).encode('utf-8'), {}, 0.0)
+
+        events = []
+        engine = Engine(fields=['country'])
+        result = engine.lookup_sync('192.0.2.1', on_event=lambda *event: events.append(event[:2]))
+        self.assertEqual(result.compiled, {'country': 'United States'})
+        self.assertEqual(engine.request_count, 1)
+        self.assertIn(('skipped', 'IPInfo'), events)
+
+        engine = Engine(fields=['city'])
+        result = engine.lookup_sync('192.0.2.1')
+        self.assertEqual(engine.request_count, 2)
+        self.assertEqual(result.errors, {'IPInfo': 'HTTP 503'})
+        # ip-api.com's empty city is kept when the gap provider fails
+        self.assertEqual(result.compiled, {'city': ''})
+
+    def test_concurrent_async_with_shares_one_transport(self):
+        engine = nwo_core.LookupEngine()
+
+        async def user(delay):
+            async with engine:
+                transport = engine._shared_transport()
+                await asyncio.sleep(delay)
+                self.assertIs(engine._shared_transport(), transport)
+                return transport
+
+        async def main():
+            return await asyncio.gather(user(0), user(0.01), user(0.02))
+
+        transports = asyncio.run(main())
+        self.assertEqual(len({id(transport) for transport in transports}), 1)
+        self.assertEqual(engine._transports, {})
+
+
+if __name__ == '__main__':
+    unittest.main()